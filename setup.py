@@ -16,7 +16,6 @@ setup(
             'cchardet==2.2.0a2',
             'configuration-maker',
             'datasets',
-            'evaluate',
             'numpy',
             'pacer-tools',
             'pandas',
@@ -28,6 +27,10 @@ setup(
             'tqdm',
             'transformers',
 	],
+	extras_require={
+		'fast': ['orjson', 'pysimdjson', 'rapidfuzz'],
+		'arrow': ['pyarrow'],
+	},
 	
 	data_files=[
         ('scales_nlp', glob('src/scales_nlp/data/*')),
@@ -1,9 +1,32 @@
+import importlib
 from scales_nlp.version import __version__
 from scales_nlp.config import config
 from scales_nlp.labels import labels
 from scales_nlp.cli import main as cli
 from scales_nlp.utils import *
 from scales_nlp.docket import Docket
-from scales_nlp.pipelines import pipeline
-import scales_nlp.datasets as datasets
-from scales_nlp.routines import training_routine
+from scales_nlp.cache import DocketCache, docket_cache
+from scales_nlp.index import PacerIndex, pacer_index
+from scales_nlp.downloads import DownloadQueue, download_cases
+from scales_nlp.tables import docket_table
+
+
+# modules that depend on torch / transformers are only imported when first used
+_lazy_modules = ['datasets', 'pipelines', 'routines']
+_lazy_attributes = {
+    'pipeline': ('scales_nlp.pipelines', 'pipeline'),
+    'training_routine': ('scales_nlp.routines', 'training_routine'),
+    'hyperparameter_sweep': ('scales_nlp.routines', 'hyperparameter_sweep'),
+    'COURTS': ('scales_nlp.utils', 'COURTS'),
+    'STATES': ('scales_nlp.utils', 'STATES'),
+    'DIVISIONS': ('scales_nlp.utils', 'DIVISIONS'),
+}
+
+
+def __getattr__(name):
+    if name in _lazy_modules:
+        return importlib.import_module('scales_nlp.' + name)
+    if name in _lazy_attributes:
+        module_name, attribute = _lazy_attributes[name]
+        return getattr(importlib.import_module(module_name), attribute)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,140 @@
+import hashlib
+import os
+import pickle
+from pathlib import Path
+from typing import Union, Tuple, Dict
+import scales_nlp
+from scales_nlp import config
+
+
+class DocketCache():
+    """
+    Cache of processed Docket objects, stored as one pickle per ucid.
+
+    Entries are keyed on the size and mtime of the case, label and judge files (or judge store), the package version and
+    the event rules version, so a docket is rebuilt whenever any of its inputs or the processing logic
+    changes.  When the cache grows past `max_size` MB the least recently used dockets are evicted.
+    """
+    def __init__(self, cache_dir: Union[str, Path]=None, max_size: int=None):
+        self.cache_dir = Path(cache_dir if cache_dir is not None else config['DOCKET_CACHE_DIR'])
+        self.max_size = (max_size if max_size is not None else config['DOCKET_CACHE_SIZE']) * 1024 ** 2
+        self.size = None
+        self.hits = 0
+        self.misses = 0
+
+    def path(self, ucid: str) -> Path:
+        court = ucid.split(';;')[0]
+        return self.cache_dir / court / (hashlib.sha1(ucid.encode()).hexdigest() + '.pkl')
+
+    def fingerprint(self, ucid: str, skip_monkey_patch: bool=False) -> Tuple:
+        court, _, _, year = scales_nlp.get_ucid_components(ucid)
+        paths = [
+            scales_nlp.case_path(ucid),
+            scales_nlp.case_labels_path(ucid),
+            scales_nlp.case_judge_labels_path(ucid),
+            scales_nlp.judge_store_path(court, year),
+        ]
+        files = []
+        for path in paths:
+            try:
+                stat = path.stat()
+                files.append((str(path), stat.st_size, stat.st_mtime_ns))
+            except OSError:
+                files.append((str(path), None, None))
+        return (scales_nlp.__version__, scales_nlp.docket.event_rules_version, skip_monkey_patch, tuple(files))
+
+    def get(self, ucid: str, skip_monkey_patch: bool=False) -> 'scales_nlp.Docket':
+        path = self.path(ucid)
+        docket = None
+        try:
+            with open(path, 'rb') as f:
+                fingerprint, cached_docket = pickle.load(f)
+            if fingerprint == self.fingerprint(ucid, skip_monkey_patch):
+                docket = cached_docket
+                os.utime(path)
+        except FileNotFoundError:
+            pass
+        except Exception:
+            # truncated or corrupted pickles, and pickles of an older class layout, are misses
+            try:
+                size = path.stat().st_size
+                path.unlink()
+                if self.size is not None:
+                    self.size -= size
+            except OSError:
+                pass
+
+        if docket is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return docket
+
+    def set(self, ucid: str, docket: 'scales_nlp.Docket', skip_monkey_patch: bool=False):
+        path = self.path(ucid)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fingerprint = self.fingerprint(ucid, skip_monkey_patch)
+        docket.events # make sure the docket is fully processed before it is cached
+        temp_path = path.with_suffix('.tmp{}'.format(os.getpid()))
+        with open(temp_path, 'wb') as f:
+            pickle.dump((fingerprint, docket), f, protocol=pickle.HIGHEST_PROTOCOL)
+        try:
+            # an existing entry for the ucid is replaced, so its size no longer counts
+            old_size = path.stat().st_size
+        except OSError:
+            old_size = 0
+        os.replace(temp_path, path)
+
+        if self.size is None:
+            self.size = sum(x.stat().st_size for x in self.cache_dir.glob('*/*.pkl'))
+        else:
+            self.size += path.stat().st_size - old_size
+        if self.size > self.max_size:
+            self.evict()
+
+    def load(self, ucid: str, skip_monkey_patch: bool=False) -> 'scales_nlp.Docket':
+        docket = self.get(ucid, skip_monkey_patch)
+        if docket is None:
+            docket = scales_nlp.Docket.from_ucid(ucid, skip_monkey_patch=skip_monkey_patch)
+            self.set(ucid, docket, skip_monkey_patch)
+        return docket
+
+    def evict(self, target: float=0.9):
+        """Delete the least recently used dockets until the cache is under `target` of its max size."""
+        files = []
+        for path in self.cache_dir.glob('*/*.pkl'):
+            try:
+                stat = path.stat()
+                files.append((stat.st_mtime, stat.st_size, path))
+            except OSError:
+                continue
+        self.size = sum(x[1] for x in files)
+        for _, size, path in sorted(files, key=lambda x: x[0]):
+            if self.size <= target * self.max_size:
+                break
+            path.unlink(missing_ok=True)
+            self.size -= size
+
+    def clear(self):
+        for path in self.cache_dir.glob('*/*.pkl'):
+            path.unlink(missing_ok=True)
+        self.size = 0
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups > 0 else None,
+        }
+
+
+_docket_cache = None
+
+
+def docket_cache() -> DocketCache:
+    """Returns the module-wide docket cache used by `Docket.from_ucid(ucid, cache=True)`."""
+    global _docket_cache
+    if _docket_cache is None:
+        _docket_cache = DocketCache()
+    return _docket_cache
@@ -2,7 +2,6 @@ import os
 from pathlib import Path
 import shutil
 import click
-import pandas as pd
 import scales_nlp
 from scales_nlp import config
 
@@ -44,22 +43,70 @@ def configure(group, reset):
 
 
 @click.command()
-@click.argument('ucid')
-def download(ucid):
-    """Download a case from PACER. This will bill your PACER account.  
+@click.argument('ucid', default=None, required=False)
+@click.option('--from-file', default=None, type=click.Path(exists=True), help='CSV of ucids to download (a `ucid` column or one ucid per line)')
+@click.option('--workers', default=1, help='Number of scraper workers per court')
+@click.option('--max-attempts', default=3, help='Number of times to retry a case before marking it as failed')
+@click.option('--scraper-cmd', default='pacer-tools scraper', help='Scraper command to run')
+@click.option('--courts', default=1, help='Number of courts to download from at the same time')
+@click.option('--rate', default=None, type=float, help='Maximum number of cases to download per minute')
+@click.option('--budget', default=None, type=float, help='Maximum spend in dollars, estimated from already downloaded cases')
+@click.option('--batch-size', default=None, type=int, help='Maximum number of cases per scraper run')
+@click.option('--retry-failed/--no-retry-failed', default=False, help='Retry cases from the file that failed in earlier runs (a single UCID is always retried)')
+@click.option('--resume/--no-resume', default=False, help='Also download cases left pending by earlier runs, e.g. when the budget ran out')
+def download(ucid, from_file, workers, max_attempts, scraper_cmd, courts, rate, budget, batch_size, retry_failed, resume):
+    """Download cases from PACER. This will bill your PACER account.  
     
-    Provide the UCID of the case.  The ucid consists of {court};;{docket_number}
+    Provide the UCID of the case, or a file of UCIDs with `--from-file`, or only `--resume` to finish the cases left
+    pending by earlier runs.  The ucid consists of {court};;{docket_number}
     
     Example UCID: ilnd;;1:21-cv-04600
+
+    Cases are downloaded in one scraper run per court, and progress is saved in the PACER_DIR so that
+    repeated runs skip cases that have already been downloaded.  Every scraper run is recorded in a ledger
+    with its duration and cost.
     """
-    scales_nlp.utils.crawl_pacer(ucid)
+    if from_file is not None:
+        ucids = scales_nlp.downloads.read_ucids(from_file)
+    elif ucid is not None:
+        ucids = [ucid]
+        retry_failed = True
+    elif resume:
+        ucids = []
+    else:
+        raise click.UsageError('Provide a UCID, --from-file or --resume')
+    queue = scales_nlp.download_cases(
+        ucids, workers=workers, max_attempts=max_attempts, scraper_cmd=scraper_cmd,
+        courts=courts, rate=rate, budget=budget, batch_size=batch_size, retry_failed=retry_failed,
+        resume=resume,
+    )
+    print(queue.counts())
 
 
 @click.command()
 @click.argument('court', default=None, required=False)
-def parse(court):
-    """Parse downloaded PACER data in the PACER_DIR into JSON format.  Leave `court` blank to parse all courts."""
-    scales_nlp.utils.parse_pacer_dir(court)
+@click.option('--workers', default=None, type=int, help='Number of courts to parse concurrently (defaults to the number of CPUs)')
+@click.option('--force/--no-force', default=False, help='Re-parse every case, even if its JSON is up to date')
+@click.option('--full-index/--no-full-index', default=False, help='Re-stat every file in the index first, to find HTML that was overwritten in place')
+def parse(court, workers, force, full_index):
+    """Parse downloaded PACER data in the PACER_DIR into JSON format.  Leave `court` blank to parse all courts.
+
+    Only cases whose HTML is newer than their JSON (or that have no JSON yet) are parsed.
+    """
+    results = scales_nlp.utils.parse_pacer_dir(court, workers=workers, force=force, full_index=full_index)
+    if any(result['returncode'] != 0 for result in results):
+        raise click.ClickException('parser failed for: ' + ', '.join(result['court'] for result in results if result['returncode'] != 0))
+
+
+@click.command()
+@click.argument('court', default=None, required=False)
+@click.option('--full/--no-full', default=False, help='Re-list every directory instead of only those that changed')
+def index(court, full):
+    """Update the index of cases in the PACER_DIR.  Leave `court` blank to index all courts."""
+    pacer_index = scales_nlp.pacer_index(refresh=False)
+    updated = pacer_index.refresh(court, full=full)
+    for kind, directories in updated.items():
+        print(f'{kind}: {len(pacer_index.query(court=court, kind=kind))} files ({directories} directories updated)')
 
 
 @click.command()
@@ -70,61 +117,132 @@ def update_labels(batch_size, reset):
     scales_nlp.utils.update_classifier_predictions(batch_size, reset)
 
 
+def parse_step_range(ctx, param, value):
+    """Click callback for a range of steps, such as 10-15."""
+    try:
+        first, last = (int(step) for step in value.split('-'))
+    except ValueError:
+        raise click.BadParameter('expected a range of steps, such as 10-15')
+    if not 0 < first <= last:
+        raise click.BadParameter('expected a range of steps, such as 10-15')
+    return first, last
+
+
 @click.command()
 @click.argument('data-path')
 @click.argument('output-dir')
 @click.argument('task')
-@click.option('--model-name', default=config['MODEL_NAME'], help='Name of model to finetune')
+@click.option('--model-name', default=lambda: config['MODEL_NAME'], help='Name of model to finetune')
 @click.option('--loss', default=None, help='Name of loss to use for training')
 @click.option('--metric', default=None, help='Name of metric to use for evaluation')
-@click.option('--max-length', default=config['MAX_LENGTH'], help='Truncate inputs to max token sequence length')
-@click.option('--eval-split', default=config['EVAL_SPLIT'], help='Proportion of data to use for evaluation')
-@click.option('--epochs', default=config['EPOCHS'], help='Number of training epochs')
-@click.option('--train-batch-size', default=config['TRAIN_BATCH_SIZE'], help='Train batch size')
-@click.option('--eval-batch-size', default=config['EVAL_BATCH_SIZE'], help='Evaluation batch size')
-@click.option('--gradient-accumulation-steps', default=config['GRADIENT_ACCUMULATION_STEPS'], help='Artificially increase the train batch size')
-@click.option('--learning-rate', default=config['LEARNING_RATE'], help='Learning rate')
-@click.option('--warmup-ratio', default=config['WARMUP_RATIO'], help='Learning rate warmup')
-@click.option('--weight-decay', default=config['WEIGHT_DECAY'], help='Weight decay for AdamW')
-@click.option('--save-steps', default=config['SAVE_STEPS'], help='Save model checkpoint every n steps')
+@click.option('--max-length', default=lambda: config['MAX_LENGTH'], type=int, help='Truncate inputs to max token sequence length')
+@click.option('--eval-split', default=lambda: config['EVAL_SPLIT'], type=float, help='Proportion of data to use for evaluation')
+@click.option('--epochs', default=lambda: config['EPOCHS'], type=int, help='Number of training epochs')
+@click.option('--train-batch-size', default=lambda: config['TRAIN_BATCH_SIZE'], type=int, help='Train batch size')
+@click.option('--eval-batch-size', default=lambda: config['EVAL_BATCH_SIZE'], type=int, help='Evaluation batch size')
+@click.option('--gradient-accumulation-steps', default=lambda: config['GRADIENT_ACCUMULATION_STEPS'], type=int, help='Artificially increase the train batch size')
+@click.option('--learning-rate', default=lambda: config['LEARNING_RATE'], type=float, help='Learning rate')
+@click.option('--warmup-ratio', default=lambda: config['WARMUP_RATIO'], type=float, help='Learning rate warmup')
+@click.option('--weight-decay', default=lambda: config['WEIGHT_DECAY'], type=float, help='Weight decay for AdamW')
+@click.option('--save-steps', default=lambda: config['SAVE_STEPS'], type=int, help='Save model checkpoint every n steps')
+@click.option('--group-by-length/--no-group-by-length', default=lambda: config['GROUP_BY_LENGTH'], help='Batch examples of similar length together to reduce padding')
+@click.option('--async-checkpoints/--no-async-checkpoints', default=lambda: config['ASYNC_CHECKPOINTS'], help='Write checkpoints in the background without pausing training')
+@click.option('--profile/--no-profile', default=False, help='Log throughput, padding, dataloader time and memory, and record a profiler trace')
+@click.option('--profile-steps', default='10-15', callback=parse_step_range, help='First and last training step to record with torch.profiler when profiling, e.g. 10-15')
 @click.option('--push', default=None, help='model id to push to hub')
 @click.option('--overwrite/--no-overwrite', default=False, help='Overwrite output dir if it exists')
+@click.option('--resume/--no-resume', default=False, help='Resume from the latest checkpoint in the output dir if it exists')
 @click.option('--multi-label-delimiter', default='|', help='Delimiter for splitting labels in multi-label-classification task')
 @click.option('--text-col', default='text', help='The column with text')
 @click.option('--label-col', default='label', help='The column with labels')
+@click.option('--teacher-name', default='scales-okn/docket-classification', help='Teacher model for the distillation task')
+@click.option('--student-layers', default=4, help='Number of student layers for the distillation task')
+@click.option('--student-hidden-size', default=None, type=int, help='Student hidden size for the distillation task, defaults to the teacher hidden size')
 def train(
         data_path, output_dir, task, model_name, 
         loss, metric, max_length, eval_split, epochs, 
         train_batch_size, eval_batch_size, gradient_accumulation_steps,
         learning_rate, warmup_ratio, weight_decay,
-        save_steps, push, overwrite, 
-        multi_label_delimiter, text_col, label_col
+        save_steps, group_by_length, async_checkpoints, profile, profile_steps, push, overwrite, resume,
+        multi_label_delimiter, text_col, label_col, teacher_name, student_layers, student_hidden_size
     ):
     """
-    Run a training routine from a csv file.
+    Run a training routine from a csv, parquet or json lines file.
 
     Specify one of the following tasks:
     \n\tclassification
     \n\tmulti-label-classification
     \n\ttoken-classification (ner)
+    \n\tdistillation (unlabeled text, trains a smaller student on the soft labels of a teacher)
     """
     
-    data = pd.read_csv(data_path)
-    texts = list(data[text_col].values)
-    labels = list(data[label_col].astype(str).values)
+    routine_kwargs = {}
     if task == 'multi-label-classification':
-        labels = [[x for x in labels.split(multi_label_delimiter) if x != ''] for labels in labels]
-    
-    routine = scales_nlp.training_routine(task,
+        routine_kwargs = {'multi_label_delimiter': multi_label_delimiter}
+    elif task == 'distillation':
+        routine_kwargs = {'teacher_name': teacher_name, 'student_layers': student_layers, 'student_hidden_size': student_hidden_size}
+    routine = scales_nlp.training_routine(task, **routine_kwargs,
         model_name=model_name, loss=loss, metric=metric, 
         max_length=max_length, eval_split=eval_split, epochs=epochs,
         train_batch_size=train_batch_size, eval_batch_size=eval_batch_size, 
         gradient_accumulation_steps=gradient_accumulation_steps, learning_rate=learning_rate,
         warmup_ratio=warmup_ratio, weight_decay=weight_decay,
-        save_steps=save_steps,
+        save_steps=save_steps, group_by_length=group_by_length, async_checkpoints=async_checkpoints,
+        profile=profile, profile_steps=profile_steps,
     )
 
-    routine.train(output_dir, texts, labels, push=push, overwrite=overwrite)
+    routine.train_from_file(output_dir, data_path, text_col=text_col, label_col=label_col, push=push, overwrite=overwrite, resume=resume)
+
+
+def parse_values(value_type):
+    """Click callback for comma separated lists of values."""
+    def callback(ctx, param, value):
+        try:
+            return [value_type(x) for x in value.split(',') if x.strip() != '']
+        except ValueError:
+            raise click.BadParameter(f'expected a comma separated list of {value_type.__name__} values')
+    return callback
+
+
+@click.command()
+@click.argument('data-path')
+@click.argument('output-dir')
+@click.argument('task')
+@click.option('--model-name', default=lambda: config['MODEL_NAME'], help='Name of model to finetune')
+@click.option('--learning-rate', default='1e-5,3e-5,5e-5', callback=parse_values(float), help='Comma separated learning rates')
+@click.option('--train-batch-size', default='8,16', callback=parse_values(int), help='Comma separated train batch sizes')
+@click.option('--max-length', default='128,256', callback=parse_values(int), help='Comma separated max token sequence lengths')
+@click.option('--epochs', default='2,4', callback=parse_values(int), help='Comma separated numbers of training epochs')
+@click.option('--strategy', default='grid', type=click.Choice(['grid', 'random']), help='Search every combination, or sample random trials')
+@click.option('--trials', default=None, type=int, help='Number of random trials, or a random subset of the grid')
+@click.option('--workers', default=1, help='Number of trials to run in parallel')
+@click.option('--threads-per-trial', default=None, type=int, help='Torch threads per trial, defaults to splitting the cpu cores between workers')
+@click.option('--patience', default=3, help='Stop a trial after this many evaluations without improvement')
+@click.option('--metric', default='eval_loss', help='Metric to pick checkpoints, prune and rank trials by')
+@click.option('--prune/--no-prune', default=True, help='Stop trials that are worse than the median of the other trials at an evaluation')
+@click.option('--prune-min-trials', default=3, help='Number of other trials evaluated at a step before pruning at it')
+@click.option('--eval-split', default=lambda: config['EVAL_SPLIT'], type=float, help='Proportion of data to use for evaluation')
+@click.option('--save-steps', default=lambda: config['SAVE_STEPS'], type=int, help='Evaluate and save a checkpoint every n steps')
+@click.option('--seed', default=0, help='Seed for sampling random trials')
+@click.option('--text-col', default='text', help='The column with text')
+@click.option('--label-col', default='label', help='The column with labels')
+def sweep(
+        data_path, output_dir, task, model_name, learning_rate, train_batch_size, max_length, epochs,
+        strategy, trials, workers, threads_per_trial, patience, metric, prune, prune_min_trials, eval_split, save_steps, seed,
+        text_col, label_col
+    ):
+    """
+    Run a hyperparameter search for a training routine and print a leaderboard of the trials.
+
+    Trials run in parallel processes over a csv, parquet or json lines file that is tokenized once and shared by all trials.
+    """
+    search_space = {'learning_rate': learning_rate, 'train_batch_size': train_batch_size, 'max_length': max_length, 'epochs': epochs}
+    leaderboard = scales_nlp.hyperparameter_sweep(
+        task, data_path, output_dir, search_space=search_space, strategy=strategy, num_trials=trials,
+        workers=workers, threads_per_trial=threads_per_trial, patience=patience, metric=metric, seed=seed,
+        prune=prune, prune_min_trials=prune_min_trials, text_col=text_col, label_col=label_col, model_name=model_name, eval_split=eval_split, save_steps=save_steps,
+    )
+    print(leaderboard.drop(columns=['output_dir'], errors='ignore').to_string(index=False))
 
 
 @click.group()
@@ -136,8 +254,10 @@ def main():
 main.add_command(configure)
 main.add_command(download)
 main.add_command(parse)
+main.add_command(index)
 main.add_command(update_labels)
 main.add_command(train)
+main.add_command(sweep)
 
 
 if config['DEVELOPER_MODE']:
@@ -130,6 +130,46 @@ keys = [
 		description='Save checkpoint and evaluate model every X steps',
 	),
 
+	ConfigKey(
+		name='GROUP_BY_LENGTH',
+		group='train-args',
+		key_type='bool',
+		default=True,
+		description='Whether to batch training examples of similar length together to reduce padding',
+	),
+
+	ConfigKey(
+		name='ASYNC_CHECKPOINTS',
+		group='train-args',
+		key_type='bool',
+		default=False,
+		description='Whether to write checkpoints in a background thread instead of pausing training',
+	),
+
+	ConfigKey(
+		name='DOCKET_CACHE_DIR',
+		group='cache',
+		key_type='path',
+		default=Path.home() / '.cache' / 'scales-nlp' / 'dockets',
+		description='Path to the directory for cached processed dockets',
+	),
+
+	ConfigKey(
+		name='DOCKET_CACHE_SIZE',
+		group='cache',
+		key_type='int',
+		default=10000,
+		description='Maximum size of the docket cache in MB, least recently used dockets are evicted first',
+	),
+
+	ConfigKey(
+		name='DATASET_CACHE_DIR',
+		group='cache',
+		key_type='path',
+		default=Path.home() / '.cache' / 'scales-nlp' / 'datasets',
+		description='Path to the directory for tokenized training datasets',
+	),
+
 	ConfigKey(
 		name='DEVELOPER_MODE',
 		group='dev',
@@ -1,59 +1,121 @@
-import requests
-import torch
-from tqdm import tqdm
+import hashlib
+import json
+import os
+from pathlib import Path
+from toolz import partition_all
 from scales_nlp import config
 
 
+def data_fingerprint(*objects, chunk_size=10000) -> str:
+    """Hash of json serializable objects, lists are hashed in chunks so large datasets are never serialized at once."""
+    hasher = hashlib.sha1()
+    for obj in objects:
+        if isinstance(obj, (list, tuple)):
+            hasher.update(str(len(obj)).encode())
+            for chunk in partition_all(chunk_size, obj):
+                hasher.update(json.dumps(chunk, sort_keys=True, default=str).encode())
+        else:
+            hasher.update(json.dumps(obj, sort_keys=True, default=str).encode())
+    return hasher.hexdigest()
 
 
-class TokenClassificationDataset(torch.utils.data.Dataset):
-    def __init__(self, tokenizer, texts, spans, label_names, max_length=512):
-        self.tokenizer = tokenizer
-        self.texts = texts
-        self.spans = spans
-        self.label_names = label_names
-        self.label_map = {'O': 0}
-        for label_name in sorted(label_names):
-            self.label_map['B-' + label_name] = len(self.label_map)
-            self.label_map['I-' + label_name] = len(self.label_map)
-        self.max_length = max_length
-
-    def __getitem__(self, i):
-        text = self.texts[i]
-        inputs = self.tokenizer(text, padding="max_length", max_length=self.max_length, truncation=True, return_tensors="pt", return_offsets_mapping=True)
-        example = {k: v[0] for k, v in inputs.items()}
-        example['labels'] = self.example_spans_to_labels(example, self.spans[i])
-        del example['offset_mapping']
-        return example
-
-    def __len__(self):
-        return len(self.texts)
-
-    def example_spans_to_labels(self, example, spans):
-        input_ids = example['input_ids']
-        spans = sorted(spans, key=lambda x: x['start'])
-
-        labels = []
-        current_label = None
-        for i in range(len(example['input_ids'])):
-            offset = example['offset_mapping'][i]
-            
-            if len(spans) > 0 and offset[0] >= spans[0]['end']:
-                spans.pop(0)
-                current_label = None
-
-            if offset[1] == 0:
-                labels.append(-100)
-                current_label = None
-            elif len(spans) == 0 or offset[1] <= spans[0]['start']:
-                labels.append(0)
-                current_label = None
+def tokenizer_fingerprint(tokenizer) -> str:
+    """Hash of the tokenizer vocabulary and settings, independent of where the tokenizer was loaded from."""
+    if tokenizer.is_fast:
+        state = json.loads(tokenizer.backend_tokenizer.to_str())
+        # truncation and padding are set on the backend by each call to the tokenizer
+        state.pop('truncation', None)
+        state.pop('padding', None)
+    else:
+        state = tokenizer.get_vocab()
+    return data_fingerprint(type(tokenizer).__name__, state, tokenizer.padding_side, tokenizer.truncation_side)
+
+
+def example_spans_to_labels(offset_mapping, spans, label_map):
+    """BIO labels for one tokenized example, see `spans_to_labels`."""
+    spans = sorted(spans, key=lambda x: x['start'])
+    labels = []
+    current_label = None
+    i = 0
+    for offset in offset_mapping:
+        if i < len(spans) and offset[0] >= spans[i]['end']:
+            i += 1
+            current_label = None
+
+        if offset[1] == 0:
+            labels.append(-100)
+            current_label = None
+        elif i == len(spans) or offset[1] <= spans[i]['start']:
+            labels.append(0)
+            current_label = None
+        else:
+            if current_label is None:
+                current_label = spans[i]['label']
+                labels.append(label_map['B-' + current_label])
             else:
-                if current_label is None:
-                    current_label = spans[0]['label']
-                    labels.append(self.label_map['B-' + current_label])
-                else:
-                    labels.append(self.label_map['I-' + current_label])
+                labels.append(label_map['I-' + current_label])
+    return labels
+
+
+def spans_to_labels(offset_mappings, spans, label_map):
+    """
+    BIO labels for a batch of tokenized examples from their offset mappings and character spans.
+
+    Tokens with an end offset of 0 (special and padding tokens) are labeled -100, tokens that overlap the current
+    span are labeled B- or I- and all other tokens O.
+    """
+    return [
+        example_spans_to_labels(offset_mapping, example_spans, label_map)
+        for offset_mapping, example_spans in zip(offset_mappings, spans)
+    ]
+
+
+def bio_label_map(label_names):
+    """Map of BIO tags to label ids, with 'O' as 0 followed by the B- and I- tags of each label in sorted order."""
+    label_map = {'O': 0}
+    for label_name in sorted(label_names):
+        label_map['B-' + label_name] = len(label_map)
+        label_map['I-' + label_name] = len(label_map)
+    return label_map
+
+
+def tokenize_spans(tokenizer, texts, spans, label_map, max_length=512, padding=False):
+    """Tokenize a batch of texts and align their character spans to BIO labels, with the token count of each example as `length`."""
+    inputs = tokenizer(texts, padding=padding, max_length=max_length, truncation=True, return_offsets_mapping=True)
+    inputs['labels'] = spans_to_labels(inputs['offset_mapping'], spans, label_map)
+    inputs['length'] = [int(sum(mask)) for mask in inputs['attention_mask']]
+    del inputs['offset_mapping']
+    return dict(inputs)
+
+
+def load_data_file(path):
+    """Load a csv, parquet or json lines file into an Arrow dataset in the DATASET_CACHE_DIR, without reading it into memory."""
+    from datasets import load_dataset
+    path = Path(path)
+    builders = {'.csv': 'csv', '.parquet': 'parquet', '.pq': 'parquet', '.json': 'json', '.jsonl': 'json'}
+    if path.suffix not in builders:
+        raise ValueError(f'Unsupported data file {path}, expected one of {", ".join(builders)}')
+    return load_dataset(builders[path.suffix], data_files=str(path.resolve()), split='train', cache_dir=str(config['DATASET_CACHE_DIR']))
+
 
-        return torch.tensor(labels)
+def cached_map(dataset, function, fingerprint, cache_dir=None, batch_size=1000, desc=None):
+    """
+    Apply a batched function to a dataset and cache the result as an Arrow file named by `fingerprint`.
 
+    The result is written in chunks and memory-mapped, and is read straight from the cache when the same
+    fingerprint is mapped again.
+    """
+    from datasets import Dataset
+    cache_dir = Path(cache_dir if cache_dir is not None else config['DATASET_CACHE_DIR'])
+    path = cache_dir / (fingerprint + '.arrow')
+    if not path.exists():
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        temp_path = path.with_suffix(f'.{os.getpid()}.tmp')
+        dataset.map(
+            function, batched=True, batch_size=batch_size, remove_columns=dataset.column_names,
+            cache_file_name=str(temp_path), new_fingerprint=fingerprint, desc=desc,
+        )
+        temp_path.replace(path)
+    data = Dataset.from_file(str(path))
+    data.set_format('torch')
+    return data
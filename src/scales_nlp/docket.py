@@ -1,11 +1,22 @@
 import re
 import json
 import pandas as pd
-from copy import deepcopy
 from itertools import chain
 from fuzzywuzzy import fuzz
 import scales_nlp
 
+try:
+    from rapidfuzz import fuzz as rapid_fuzz
+except ImportError:
+    rapid_fuzz = None
+
+# rapidfuzz scores like fuzzywuzzy on its python-Levenshtein backend, but not like its difflib fallback
+if fuzz.SequenceMatcher.__module__ == 'difflib':
+    rapid_fuzz = None
+
+# bump whenever label or event processing changes, so cached dockets are rebuilt
+event_rules_version = 2
+
 label_remappings = {
     'admin closing': ('attribute_admin_closing',),
     'arbitration motion': ('motion', 'attribute_motion_for_arbitration'),
@@ -121,22 +132,270 @@ event_labels = (
     'warrant'
 )
 
+
+
+def compile_event_rules(rules):
+    """
+    Compiles (event name, required label groups, excluded labels, text condition) rules for match_event_rules.
+    An entry matches a rule if it has at least one label from each required group, none of the excluded
+    labels, and its text passes the (optional) text condition.
+    """
+    return tuple(
+        (name, tuple(frozenset(group) for group in required), frozenset(excluded), text_condition)
+        for name, required, excluded, text_condition in rules
+    )
+
+
+def match_event_rules(rules, labels, text):
+    """Returns the name of the first rule matched by an entry's label set and text."""
+    for name, required, excluded, text_condition in rules:
+        if excluded.isdisjoint(labels) and all(not group.isdisjoint(labels) for group in required):
+            if text_condition is None or text_condition(text):
+                return name
+
+
+opening_event_rules = compile_event_rules((
+    ('complaint', (('complaint',),), (), None),
+    ('notice of removal', (('notice of removal',),), (), None),
+    ('information', (('information',),), (), None),
+    ('indictment', (('indictment',),), (), None),
+    ('petition', (('petition',),), (), None),
+    ('inbound transfer', (('inbound transfer',),), (), None),
+    ('transfer', (('transfer',),), (), None),
+))
+voluntary_dismissal_labels = (
+    'voluntary dismissal resolution',
+    # captures notices of dismissal, stipulations of dismissal
+    # orders granting on the basis of notices / stipulation of dismissal
+    # orders disposing of cases via 'voluntary dismissal' or rule 41(a)
+    'stipulation of dismissal', # entries that are stipulations of dismissal (redundant)
+    'notice of dismissal', # entries that are notices of dismissal (redundant)
+    'notice of voluntary dismissal', # entries that are notices of voluntary dismissal (redundant)
+)
+settlement_labels = (
+    'settlement reached', # catch all label for any indicator that the parties settled using the language of settlement
+    'consent judgment', # entries that are consent judgments
+    'consent judgment resolution', # orders granting motions for or disposing of case via consent judgments
+    'settlement agreement', # entries that are settlement agreements
+    'motion for settlement', # entries that are motions for settlement
+    'notice of settlement', # entries that are notices of settlement
+    'stipulation for settlement', # entries that are stipulations for settlement
+)
+dispositive_event_rules = compile_event_rules((
+    ('sentence', (('sentence',),), (), None),
+    ('bench trial', (('trial',), ('bench trial',)), (), None),
+    ('jury trial', (('trial',), ('jury trial',)), (), None),
+    ('other trial', (('trial',),), (), None),
+    ('remand', (('remand resolution',),), (), None),
+    ('default judgment', (('default judgment resolution',),), (), None),
+    ('summary judgment', (('granting motion for summary judgment',),), (), None),
+    ('rule 68', (('rule 68 resolution',),), (), None),
+    # entries that are consent decrees
+    # orders granting motions for consent decrees
+    # orders disposing of the case via consent decree
+    ('consent decree', (('consent decree resolution',),), (), None),
+    # voluntary dismissals with prejudice are treated as settlements
+    ('voluntary dismissal (settlement)', (voluntary_dismissal_labels, settlement_labels + ('dismissed with prejudice',)), (), None),
+    ('voluntary dismissal', (voluntary_dismissal_labels,), (), None),
+    ('settlement', (settlement_labels,), (), None),
+    # what to do with motion / stipulation for judgment (prev included if bilateral)
+    ('rule 12b', (('granting motion to dismiss',),), (), None),
+    ('outbound transfer', (('outbound transfer',),), (), None),
+    ('transfer', (('transfer',),), ('inbound transfer',), None),
+    ('admin closing', (('case opened in error',),), (), None),
+    ('case dismissed', (('case dismissed',),), (), lambda text: ' usca ' not in text.lower()),
+))
+
+
+date_cache = {}
+date_re = re.compile(r'(\d{1,2})/(\d{1,2})/(\d{4})$')
+
+
+def parse_date(date):
+    """
+    Cached equivalent of `pd.to_datetime(date, errors='coerce')` for docket entry dates.  PACER dates
+    (mm/dd/yyyy) are parsed directly, anything else falls back to pandas.
+    """
+    if date in date_cache:
+        return date_cache[date]
+    parsed = None
+    if isinstance(date, str):
+        match = date_re.match(date)
+        if match is not None:
+            month, day, year = (int(x) for x in match.groups())
+            try:
+                parsed = pd.Timestamp(year=year, month=month, day=day)
+            except ValueError:
+                pass
+    if parsed is None:
+        parsed = pd.to_datetime(date, errors='coerce')
+    if len(date_cache) > 100000:
+        date_cache.clear()
+    date_cache[date] = parsed
+    return parsed
+
+
+def normalize_name(name):
+    """Mirrors fuzzywuzzy's full_process (with force_ascii) so names can be processed once up front."""
+    if name is None:
+        return ''
+    name = ''.join(x for x in name if not 128 <= ord(x) < 256)
+    return re.sub(r'(?ui)\W', ' ', name).lower().strip()
+
+
+class PartyMatcher():
+    """
+    Matches ENTERED_BY span text against a docket's party and attorney names.
+
+    Names are normalized and tokenized once, and a token -> name index (the block) is used to score
+    only the names that share a token with the text.  The result is the first name (in the original
+    order) with a token set ratio above the threshold, so names outside the block are still checked
+    when they come before a match in the block.  When no name in the block matches, names outside
+    it are only scored if the block is empty.
+    """
+    def __init__(self, names, threshold=80):
+        self.names = names
+        self.threshold = threshold
+        self.normalized_names = {}
+        self.blocks = {}
+        for party_type, party_names in names.items():
+            self.normalized_names[party_type] = [normalize_name(x) for x in party_names]
+            block = {}
+            for i, name in enumerate(self.normalized_names[party_type]):
+                for token in set(name.split()):
+                    block.setdefault(token, []).append(i)
+            self.blocks[party_type] = block
+        self.cache = {}
+
+    def score(self, text, name):
+        if not text or not name:
+            return 0
+        if rapid_fuzz is not None:
+            return int(round(rapid_fuzz.token_set_ratio(text, name)))
+        return fuzz.token_set_ratio(text, name, full_process=False)
+
+    def first_match(self, text, party_type):
+        names = self.normalized_names[party_type]
+        block = self.blocks[party_type]
+        candidates = sorted(set(chain.from_iterable(block.get(token, []) for token in text.split())))
+        if len(candidates) == 0:
+            candidates = range(len(names))
+        stop = len(names)
+        for i in candidates:
+            if self.score(text, names[i]) > self.threshold:
+                stop = i
+                break
+        if stop == len(names):
+            return None
+        candidates = set(candidates)
+        for i in range(stop):
+            if i not in candidates and self.score(text, names[i]) > self.threshold:
+                return self.names[party_type][i]
+        return self.names[party_type][stop]
+
+    def match(self, text):
+        if text not in self.cache:
+            normalized_text = normalize_name(text)
+            self.cache[text] = {party_type: self.first_match(normalized_text, party_type) for party_type in self.names}
+        return self.cache[text]
+
+
 class Docket():
-    def __init__(self, ucid, header, entries=None, judge_df=None, skip_monkey_patch=False):
+    def __init__(
+        self, ucid, header, entries=None, judge_df=None, skip_monkey_patch=False, lazy=False, label_loader=None,
+        judge_spans=None, entry_loader=None,
+    ):
+        """
+        If `lazy`, events and labels are not derived until `events`, `opening`, `dispositive_events` or an
+        entry's `labels` / `spans` are first accessed.  `label_loader` is an optional callable returning
+        `(label_json, judge_spans)` that is called at that point, so label files are only read when needed.
+        `entry_loader` is an optional callable returning the entries, used instead of `entries` and called
+        when the entries are first accessed, so header-only access doesn't parse the docket.
+        Judge labels can be passed either as `judge_spans` (see `scales_nlp.load_case_judge_spans`) or as a `judge_df`.
+        """
         self.ucid = ucid
-        self.court = scales_nlp.load_court(ucid.split(";;")[0])
         self.docket_number = ucid.split(";;")[1]
         self.header = header
-        self.entries = entries
+        self.entry_loader = entry_loader
+        self._entries = None
+        self.entry_row_numbers = {}
+        if entry_loader is None:
+            self.entries = entries
         self.judge_df = judge_df
-        self.events = []
+        if judge_spans is None:
+            judge_spans = {} if judge_df is None else scales_nlp.judge_spans_from_df(judge_df)
+        self.judge_spans = judge_spans
+        self.skip_monkey_patch = skip_monkey_patch
+        self.label_loader = label_loader
+        self._events = None
+        self._court = None
+        self._court_loaded = False
+        self._party_matcher = None
+
+        if not lazy:
+            self.load_events()
+
+    @property
+    def entries(self):
+        if self._entries is None:
+            self.entries = self.entry_loader()
+            self.entry_loader = None
+        return self._entries
 
-        for entry in self.entries:
+    @entries.setter
+    def entries(self, entries):
+        self._entries = sorted(entries, key=lambda x: x.row_number)
+        self.entry_row_numbers = {}
+        for entry in self._entries:
             entry.docket = self
-        
-        self.process_events(skip_monkey_patch)
+            self.entry_row_numbers.setdefault(entry.entry_number, entry.row_number)
+
+    @property
+    def entries_loaded(self):
+        return self._entries is not None
+
+    def load_events(self):
+        if self.label_loader is not None:
+            label_json, self.judge_spans = self.label_loader()
+            self.label_loader = None
+            self.set_classifier_labels(label_json)
+        # process_events appends to self.events, which must not trigger another load
+        self._events = []
+        try:
+            self.process_events(self.skip_monkey_patch)
+        except Exception:
+            self._events = None
+            raise
+
+    def set_classifier_labels(self, label_json):
+        label_json = {x['row_number']: x for x in label_json}
+        for entry in self:
+            entry.classifier_labels = label_json.get(entry.row_number, {}).get('labels', [])
+            entry.classifier_spans = label_json.get(entry.row_number, {}).get('spans', [])
+
+    @property
+    def events_loaded(self):
+        return self._events is not None
+
+    @property
+    def events(self):
+        if self._events is None:
+            self.load_events()
+        return self._events
+
+    @events.setter
+    def events(self, events):
+        self._events = events
+
+    @property
+    def court(self):
+        if not self._court_loaded:
+            self._court = scales_nlp.load_court(self.ucid.split(";;")[0])
+            self._court_loaded = True
+        return self._court
         
     def process_events(self, skip_monkey_patch):
+        # transfer directions are settled for every entry first, since computing an entry's labels can update related entries
         for entry in self:
             if 'transfer' in entry.labels:
                 for span in entry.spans:
@@ -151,41 +410,39 @@ class Docket():
                         elif span['court'] == 'different':
                             entry.add_label('inbound transfer')
 
-        opening_events = [
-            'complaint', 
-            'notice of removal', 
-            'information', 
-            'indictment', 
-            'petition',
-            'inbound transfer',
-            'transfer',
-        ]
-        openings = []
-
+        # match opening and dispositive events in a single pass over the entries
+        opening = None
+        all_transfer_openings = True
+        dispositive_events = []
         for entry in self:
+            labels = set(entry.labels)
             if not any(x in entry.classifier_labels for x in ['proposed', 'error']):
-                for opening_event in opening_events:
-                    if opening_event in entry.labels:
-                        openings.append(Event(opening_event, event_type='opening', entry=entry))
-                        break
-
-        if len(openings) > 0:
-            if not all(x.name == 'transfer' for x in openings) or \
-                    openings[0].entry.row_number <= min([(len(self) // 2) + 1, 10]):
-                opening = openings[0]
+                opening_event = match_event_rules(opening_event_rules, labels, entry.text)
+                if opening_event is not None:
+                    if opening is None:
+                        opening = Event(opening_event, event_type='opening', entry=entry)
+                    all_transfer_openings = all_transfer_openings and opening_event == 'transfer'
+            dispositive_event = self.get_dispositive_event(entry, labels)
+            if dispositive_event is not None:
+                dispositive_events.append(Event(dispositive_event, event_type='dispositive', entry=entry))
+
+        if opening is not None:
+            if not all_transfer_openings or \
+                    opening.entry.row_number <= min([(len(self) // 2) + 1, 10]):
                 if opening.name in ['transfer', 'inbound transfer']:
                     opening.name = 'inbound transfer'
                     opening.entry.add_label('inbound transfer')
                     opening.entry.remove_label('outbound transfer')
                     self[opening.entry.row_number].event = opening
+
+                    # the relabeled opening entry may no longer (or may now) be a dispositive event
+                    dispositive_events = [x for x in dispositive_events if x.entry is not opening.entry]
+                    dispositive_event = self.get_dispositive_event(opening.entry)
+                    if dispositive_event is not None:
+                        dispositive_events.append(Event(dispositive_event, event_type='dispositive', entry=opening.entry))
+                        dispositive_events = sorted(dispositive_events, key=lambda x: x.entry.row_number)
                 self.events.append(opening)
-        
-        dispositive_events = []
-        for entry in self:
-            dispositive_event = self.get_dispositive_event(entry)
-            if dispositive_event is not None:
-                dispositive_events.append(Event(dispositive_event, event_type='dispositive', entry=entry))
-        
+
         added_dispositive_events = []
         for event in reversed(dispositive_events):
             add_event = False
@@ -232,7 +489,7 @@ class Docket():
                 entry.event = None
 
             # pre-remapping changes
-            labels_old = deepcopy(entry.labels)
+            labels_old = list(entry.labels)
             labels_and_remappings = labels_old + list(filter(None, chain.from_iterable([label_remappings.get(x) or (None,) for x in labels_old])))
             for label in labels_old:
                 if label in labels_to_change_to_order and 'minute entry' not in labels_old:
@@ -324,91 +581,11 @@ class Docket():
                 entry.remove_label_basic('settlement')
 
 
-    def get_dispositive_event(self, entry):
-        if not any(x in entry.labels for x in ['proposed', 'error']):
-            if 'sentence' in entry.labels:
-                return 'sentence'
-                
-            ffc = 'findings of fact' in entry.labels and 'conclusions' in entry.text.lower()
-            if 'trial' in entry.labels: # or 'verdict' in entry.labels or ffc:
-                trial_label = 'other trial'
-                if 'bench trial' in entry.labels:
-                    trial_label = 'bench trial'
-                elif 'jury trial' in entry.labels:
-                    trial_label = 'jury trial'
-                return trial_label
-                
-            if 'remand resolution' in entry.labels:
-                return 'remand'
-            
-            if 'default judgment resolution' in entry.labels:
-                return 'default judgment'
-            
-            if 'granting motion for summary judgment' in entry.labels:
-                return 'summary judgment'
-            
-            if 'rule 68 resolution' in entry.labels:
-                return 'rule 68'
-
-            if 'consent decree resolution' in entry.labels:
-                # entries that are consent decrees
-                # orders granting motions for consent decrees
-                # orders disposing of the case via consent decree
-                return 'consent decree'
-
-            is_vd, is_settlement = False, False
-
-            if any(x in entry.labels for x in [
-                'voluntary dismissal resolution', 
-                # captures notices of dismissal, stipulations of dismissal
-                # orders granting on the basis of notices / stipulation of dismissal
-                # orders disposing of cases via 'voluntary dismissal' or rule 41(a)
-                'stipulation of dismissal', # entries that are stipulations of dismissal (redundant)
-                'notice of dismissal', # entries that are notices of dismissal (redundant)
-                'notice of voluntary dismissal', # entries that are notices of voluntary dismissal (redundant)
-            ]):
-                is_vd = True
-
-            if is_vd and 'dismissed with prejudice' in entry.labels:
-                is_settlement = True
-
-            if any(x in entry.labels for x in [
-                'settlement reached', # catch all label for any indicator that the parties settled using the language of settlement
-                'consent judgment', # entries that are consent judgments
-                'consent judgment resolution', # orders granting motions for or disposing of case via consent judgments
-                'settlement agreement', # entries that are settlement agreements
-                'motion for settlement', # entries that are motions for settlement
-                'notice of settlement', # entries that are notices of settlement
-                'stipulation for settlement', # entries that are stipulations for settlement
-            ]):
-                is_settlement = True
-
-            if is_vd and is_settlement:
-                return 'voluntary dismissal (settlement)'
-            elif is_vd:
-                return 'voluntary dismissal'
-            elif is_settlement:
-                return 'settlement'
-
-            # what to do with motion / stipulation for judgment (prev included if bilateral)
-   
-            if 'granting motion to dismiss' in entry.labels:
-                return 'rule 12b'
-            
-            if 'outbound transfer' in entry.labels:
-                return 'outbound transfer'
-            
-            if 'transfer' in entry.labels and 'inbound transfer' not in entry.labels:
-                return 'transfer'
-            
-            if 'sentence' in entry.labels:
-                return 'sentence'
-
-            if 'case opened in error' in entry.labels:
-                return 'admin closing'
-
-            if 'case dismissed' in entry.labels and ' usca ' not in entry.text.lower():
-                return 'case dismissed'
+    def get_dispositive_event(self, entry, labels=None):
+        if labels is None:
+            labels = set(entry.labels)
+        if 'proposed' not in labels and 'error' not in labels:
+            return match_event_rules(dispositive_event_rules, labels, entry.text)
 
     @property
     def opening(self):
@@ -422,6 +599,10 @@ class Docket():
     def dispositive_events(self):
         return [event for event in self.events if event.event_type == 'dispositive']
 
+    @property
+    def case_name(self):
+        return self.header.get('case_name')
+
     @property
     def nos(self):
         nos_code = self.header['nature_suit']
@@ -462,45 +643,81 @@ class Docket():
     def defendant_attorney_names(self):
         return self.get_attorney_names(party_type='defendant')
 
+    @property
+    def party_matcher(self):
+        if self._party_matcher is None:
+            self._party_matcher = PartyMatcher({
+                'plaintiff': self.plaintiff_names + self.plaintiff_attorney_names,
+                'defendant': self.defendant_names + self.defendant_attorney_names,
+            })
+        return self._party_matcher
+
     @staticmethod
-    def from_json(case_json, label_json=None, judge_df=None, recap=False, skip_monkey_patch=False):
-        if not recap:
-            entries = []
-            if label_json is not None:
-                label_json = {x['row_number']: x for x in label_json}
-            for row_number, entry in enumerate(case_json['docket']):
-                entry['entry_number'] = entry['ind']
-                entry['text'] = entry['docket_text']
-                del entry['ind']
-                del entry['docket_text']
-                classifier_labels = None if label_json is None else label_json.get(row_number, {}).get('labels', [])
-                classifier_spans = None if label_json is None else label_json.get(row_number, {}).get('spans', [])
-                entries.append(DocketEntry(
-                    row_number=row_number,
-                    classifier_labels=classifier_labels,
-                    classifier_spans=classifier_spans,
-                    **entry
-                ))
+    def entries_from_json(docket_json, label_json=None):
+        """Docket entries from the `docket` array of a case json, with classifier labels from a label json if given."""
+        entries = []
+        if label_json is not None:
+            label_json = {x['row_number']: x for x in label_json}
+        for row_number, entry in enumerate(docket_json):
+            entry['entry_number'] = entry['ind']
+            entry['text'] = entry['docket_text']
+            del entry['ind']
+            del entry['docket_text']
+            classifier_labels = None if label_json is None else label_json.get(row_number, {}).get('labels', [])
+            classifier_spans = None if label_json is None else label_json.get(row_number, {}).get('spans', [])
+            entries.append(DocketEntry(
+                row_number=row_number,
+                classifier_labels=classifier_labels,
+                classifier_spans=classifier_spans,
+                **entry
+            ))
+        return entries
 
+    @staticmethod
+    def from_json(case_json, label_json=None, judge_df=None, recap=False, skip_monkey_patch=False, lazy=False, label_loader=None, judge_spans=None):
+        if not recap:
+            entries = Docket.entries_from_json(case_json['docket'], label_json=label_json)
             del case_json['docket']
             return Docket(
                 ucid=case_json['ucid'],
                 header=case_json,
                 entries=entries,
                 judge_df=judge_df,
-                skip_monkey_patch=skip_monkey_patch
+                judge_spans=judge_spans,
+                skip_monkey_patch=skip_monkey_patch,
+                lazy=lazy,
+                label_loader=label_loader,
             )
     
     @staticmethod
-    def from_ucid(ucid, skip_monkey_patch=False):
-        label_json = scales_nlp.load_case_classifier_labels(ucid)
+    def from_ucid(ucid, skip_monkey_patch=False, lazy=False, cache=False):
+        """
+        Load a docket from the PACER_DIR.  With `lazy=True` only the case header is read up front (see
+        `scales_nlp.load_case_header`), so header-only access (`header`, `case_name`, `nos`, `court`, party
+        names) doesn't parse the docket entries or read the label and judge files.  The entries are parsed
+        when they are first accessed, and the labels when events or labels are first accessed.
+        With `cache=True` the processed docket is loaded from (or saved to) the docket cache.  Cached
+        dockets are fully processed, so `cache` and `lazy` can't be combined.
+        """
+        if cache and lazy:
+            raise ValueError("cache and lazy can't be combined, cached dockets are fully processed")
+        if cache:
+            return scales_nlp.docket_cache().load(ucid, skip_monkey_patch=skip_monkey_patch)
+        if lazy:
+            header = scales_nlp.load_case_header(ucid)
+            entry_loader = lambda: Docket.entries_from_json(scales_nlp.load_case(ucid)['docket'])
+            label_loader = lambda: (scales_nlp.load_case_classifier_labels(ucid), scales_nlp.load_case_judge_spans(ucid))
+            return Docket(
+                ucid=header['ucid'], header=header, skip_monkey_patch=skip_monkey_patch, lazy=True,
+                label_loader=label_loader, entry_loader=entry_loader,
+            )
         case_json = scales_nlp.load_case(ucid)
-        judge_df = scales_nlp.load_case_judge_labels(ucid)
-        return Docket.from_json(case_json, label_json=label_json, judge_df=judge_df, skip_monkey_patch=skip_monkey_patch)
+        label_json = scales_nlp.load_case_classifier_labels(ucid)
+        judge_spans = scales_nlp.load_case_judge_spans(ucid)
+        return Docket.from_json(case_json, label_json=label_json, judge_spans=judge_spans, skip_monkey_patch=skip_monkey_patch)
 
     def __iter__(self):
-        for entry in sorted(self.entries, key=lambda x: x.row_number):
-            yield entry
+        return iter(self.entries)
     
     def __getitem__(self, *args):
         return self.entries.__getitem__(*args)
@@ -513,13 +730,18 @@ class Docket():
 
 
 class DocketEntry():
+    __slots__ = (
+        'row_number', 'entry_number', 'date_filed', 'text', 'documents', 'edges',
+        'classifier_labels', 'classifier_spans', '_labels', '_spans', '_edge_index', 'event', 'docket',
+    )
+
     def __init__(
         self, row_number, entry_number=None, date_filed=None, text=None, 
         documents=[], edges=[], classifier_labels=None, classifier_spans=None, docket=None,
     ):
         self.row_number = row_number
         self.entry_number = entry_number
-        self.date_filed = pd.to_datetime(date_filed, errors='coerce')
+        self.date_filed = parse_date(date_filed)
         self.text = text
         self.documents = documents
         self.edges = edges
@@ -527,6 +749,7 @@ class DocketEntry():
         self.classifier_spans = classifier_spans
         self._labels = None
         self._spans = None
+        self._edge_index = None
         self.event = None
         self.docket = docket
     
@@ -607,15 +830,12 @@ class DocketEntry():
         ucid = self.docket.ucid
         scales_ind = self.row_number
         docket_text = self.text
-        judge_df = self.docket.judge_df
+        judge_spans = self.docket.judge_spans
 
         # load the SEL data
-        if not len(judge_df):
+        spans = judge_spans.get(scales_ind)
+        if not spans:
             return None
-        subdf = judge_df[judge_df.docket_index.eq(scales_ind)] # could be optimized if this function ends up running over entire cases
-        if not len(subdf):
-            return None
-        spans = [(subdf.at[i,'Entity_Span_Start'], subdf.at[i,'Entity_Span_End']) for i in subdf.index]
 
         # for each judge span, take note of the two words preceding it
         preceding_words = []
@@ -673,8 +893,10 @@ class DocketEntry():
             return None
 
     def get_labels(self, update=False):
+        if self.docket is not None and not self.docket.events_loaded:
+            self.docket.load_events()
         if self._labels is None:
-            self._labels = deepcopy(self.classifier_labels)
+            self._labels = list(self.classifier_labels)
             update = True
         if update:
             text = self.text.lower()
@@ -766,8 +988,10 @@ class DocketEntry():
         return self._labels
     
     def get_spans(self, update=False):
+        if self.docket is not None and not self.docket.events_loaded:
+            self.docket.load_events()
         if self._spans is None:
-            self._spans = deepcopy(self.classifier_spans)
+            self._spans = [dict(span) for span in self.classifier_spans]
             update = True
 
         if update:
@@ -794,31 +1018,29 @@ class DocketEntry():
                         else:
                             span['court'] = 'unknown'
                 elif span['entity'] == 'ENTERED_BY':
-                    for name in self.docket.plaintiff_names + self.docket.plaintiff_attorney_names:
-                        if fuzz.token_set_ratio(span['text'], name) > 80:
-                            span['party_type'] = 'plaintiff'
-                            span['party'] = name
-                            break
-                    for name in self.docket.defendant_names + self.docket.defendant_attorney_names:
-                        if fuzz.token_set_ratio(span['text'], name) > 80:
-                            span['party_type'] = 'defendant'
+                    # a defendant match overrides a plaintiff match
+                    for party_type, name in self.docket.party_matcher.match(span['text']).items():
+                        if name is not None:
+                            span['party_type'] = party_type
                             span['party'] = name
-                            break
                 elif span['entity'] in ['GRANT', 'DENY', 'MOOT', 'PARTIAL']:
-                    for edge in self.edges:
-                        if edge[-1]['end'] == span['end']:
-                            span['related_entry'] = edge[1]
-                            break
-                    if 'related_entry' not in span:
-                        if span['text'].isdigit():
-                            for entry in self.docket:
-                                if entry.entry_number == int(span['text']):
-                                    span['related_entry'] = entry.row_number
-                                    break
+                    if span['end'] in self.edge_index:
+                        span['related_entry'] = self.edge_index[span['end']]
+                    elif span['text'].isdigit():
+                        if int(span['text']) in self.docket.entry_row_numbers:
+                            span['related_entry'] = self.docket.entry_row_numbers[int(span['text'])]
                 spans.append(span)
             self._spans = list(sorted(sorted(spans, key=lambda x: x['entity']), key=lambda x: x['start']))
         return self._spans
     
+    @property
+    def edge_index(self):
+        if self._edge_index is None:
+            self._edge_index = {}
+            for edge in self.edges:
+                self._edge_index.setdefault(edge[-1]['end'], edge[1])
+        return self._edge_index
+
     @property
     def labels(self):
         return self.get_labels()
@@ -845,6 +1067,8 @@ class DocketEntry():
     
 
 class Event():
+    __slots__ = ('name', 'event_type', 'entry')
+
     def __init__(self, name, event_type, entry=None):
         self.name = name
         self.event_type = event_type
@@ -0,0 +1,270 @@
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Union, List, Dict, Tuple
+import pandas as pd
+from toolz import partition_all
+import scales_nlp
+from scales_nlp import config
+
+
+PAGE_COST = 0.10
+MAX_CASE_COST = 3.00
+billable_pages_pattern = re.compile(r'Billable\s+Pages:?\s*(?:</[^>]+>\s*)*(?:<[^>]+>\s*)*(\d+)', re.IGNORECASE)
+receipt_cost_pattern = re.compile(r'Cost:?\s*(?:</[^>]+>\s*)*(?:<[^>]+>\s*)*\$?\s*(\d+(?:\.\d+)?)', re.IGNORECASE)
+
+
+def html_receipt(path: Union[str, Path], tail_bytes: int=16384) -> Tuple[int, float]:
+    """Billable pages and cost from the PACER transaction receipt at the end of a downloaded docket."""
+    path = Path(path)
+    with open(path, 'rb') as f:
+        size = path.stat().st_size
+        f.seek(max(0, size - tail_bytes))
+        tail = f.read().decode('utf-8', errors='ignore')
+    pages = billable_pages_pattern.findall(tail)
+    cost = receipt_cost_pattern.findall(tail)
+    pages = int(pages[-1]) if pages else None
+    if cost:
+        cost = float(cost[-1])
+    elif pages is not None:
+        cost = min(pages * PAGE_COST, MAX_CASE_COST)
+    else:
+        cost = None
+    return pages, cost
+
+
+def estimate_case_costs(courts: List[str]=None, sample_size: int=200) -> Dict[str, float]:
+    """Average cost per case by court, estimated from the receipts of already downloaded dockets.
+
+    Courts without any receipts fall back to the average over all courts, and to the maximum cost
+    of a docket report when nothing has been downloaded yet.
+    """
+    files = scales_nlp.pacer_index().query(kind='html')
+    costs, all_costs = {}, []
+    for court, court_files in files.groupby('court'):
+        if len(court_files) > sample_size:
+            court_files = court_files.sample(sample_size, random_state=0)
+        court_costs = [html_receipt(path)[1] for path in court_files['path']]
+        court_costs = [cost for cost in court_costs if cost is not None]
+        if court_costs:
+            costs[court] = sum(court_costs) / len(court_costs)
+            all_costs += court_costs
+    default = sum(all_costs) / len(all_costs) if all_costs else MAX_CASE_COST
+    if courts is not None:
+        costs = {court: costs.get(court, default) for court in courts}
+    costs['default'] = default
+    return costs
+
+
+class TokenBucket():
+    """Token bucket that allows `rate` tokens per second on average, with bursts of up to `capacity` tokens.
+
+    The bucket starts full unless `tokens` is given, e.g. `tokens=0` so the first tokens are also rate limited.
+    """
+    def __init__(self, rate: float, capacity: float=None, tokens: float=None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1)
+        self.tokens = self.capacity if tokens is None else min(tokens, self.capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, tokens: float=1):
+        if tokens > self.capacity:
+            raise ValueError(f'Cannot acquire {tokens} tokens from a bucket with a capacity of {self.capacity}')
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                wait = (tokens - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class DownloadQueue():
+    """
+    Persistent queue of cases to download from PACER.
+
+    The state of every queued case (pending, done or failed, and the number of attempts) is saved to a
+    json file in the PACER_DIR after each scraper run, so an interrupted or repeated run resumes where it
+    left off.  Cases whose html already exists are marked done without being downloaded again.  Every
+    scraper run is appended to a ledger in the PACER_DIR with its duration and estimated and actual cost.
+    """
+    def __init__(self, path: Union[str, Path]=None, max_attempts: int=3, scraper_cmd: str='pacer-tools scraper', ledger_path: Union[str, Path]=None):
+        self.path = Path(path) if path is not None else config['PACER_DIR'] / '.scales-nlp-downloads.json'
+        self.ledger_path = Path(ledger_path) if ledger_path is not None else config['PACER_DIR'] / '.scales-nlp-download-ledger.csv'
+        self.max_attempts = max_attempts
+        self.scraper_cmd = scraper_cmd
+        self.state = scales_nlp.load_json(self.path) if self.path.exists() else {}
+        self.lock = threading.RLock()
+
+    def save(self):
+        with self.lock:
+            temp_path = self.path.with_suffix('.tmp')
+            scales_nlp.save_json(temp_path, self.state)
+            temp_path.replace(self.path)
+
+    def add(self, ucids: List[str], retry_failed: bool=False):
+        """Queue cases that are not in the queue yet, and with `retry_failed` give failed cases another `max_attempts` attempts."""
+        for ucid in ucids:
+            if ucid not in self.state or (retry_failed and self.state[ucid]['status'] == 'failed'):
+                self.state[ucid] = {'status': 'pending', 'attempts': 0}
+        self.save()
+
+    def update_status(self, ucid: str, returncode: int=None):
+        case = self.state[ucid]
+        html_path = scales_nlp.case_path(ucid, html=True)
+        if html_path.exists():
+            if case['status'] != 'done' and returncode is not None:
+                case['cost'] = html_receipt(html_path)[1]
+            case['status'] = 'done'
+        elif returncode is not None:
+            case['attempts'] += 1
+            case['returncode'] = returncode
+            case['status'] = 'failed' if case['attempts'] >= self.max_attempts else 'pending'
+
+    def pending(self, ucids: List[str]=None) -> Dict[str, List[str]]:
+        """Pending cases grouped by court, only among `ucids` if given."""
+        ucids = set(ucids) if ucids is not None else None
+        courts = {}
+        for ucid, case in self.state.items():
+            if case['status'] == 'pending' and (ucids is None or ucid in ucids):
+                self.update_status(ucid)
+                if case['status'] == 'pending':
+                    courts.setdefault(ucid.split(';;')[0], []).append(ucid)
+        return courts
+
+    def record(self, result: Dict):
+        with self.lock:
+            pd.DataFrame([result]).to_csv(self.ledger_path, mode='a', header=not self.ledger_path.exists(), index=False)
+
+    def ledger(self) -> pd.DataFrame:
+        return pd.read_csv(self.ledger_path) if self.ledger_path.exists() else pd.DataFrame()
+
+    def download_batch(self, court: str, ucids: List[str], workers: int=1, estimated_cost: float=None) -> Dict:
+        """Download a batch of cases from one court with a single scraper run."""
+        start = time.time()
+        returncode = scales_nlp.run_scraper(court, ucids, workers=workers, scraper_cmd=self.scraper_cmd)
+        with self.lock:
+            for ucid in ucids:
+                self.update_status(ucid, returncode)
+            self.save()
+            downloaded = [ucid for ucid in ucids if self.state[ucid]['status'] == 'done']
+            cost = sum(self.state[ucid].get('cost') or 0 for ucid in downloaded)
+        result = {
+            'court': court, 'cases': len(ucids), 'downloaded': len(downloaded), 'workers': workers,
+            'returncode': returncode, 'started': start, 'seconds': time.time() - start,
+            'estimated_cost': estimated_cost, 'cost': cost,
+        }
+        self.record(result)
+        return result
+
+    def run(
+        self, workers: int=1, courts: int=1, rate: float=None, budget: float=None, batch_size: int=None,
+        ucids: List[str]=None,
+    ) -> List[Dict]:
+        """Download pending cases until every case is done or has failed, or the budget is spent.
+
+        :param workers: Number of scraper workers (browser sessions) per scraper run, i.e. the concurrency within a court
+        :param courts: Number of courts to download from at the same time
+        :param rate: Maximum number of cases to start downloading per minute, across all courts
+        :param budget: Maximum spend in dollars, using costs estimated from already downloaded dockets
+        :param batch_size: Maximum number of cases per scraper run, defaults to all pending cases in a court
+            (and to at most `rate` cases when a rate is set)
+        :param ucids: Only download these cases, defaults to every pending case in the queue, including
+            cases left pending by earlier runs
+        :return: A summary of each scraper run
+        """
+        bucket = None
+        if rate:
+            # a scraper run starts all of its cases at once, so a batch can't be larger than a minute of cases
+            batch_size = max(1, min(batch_size or int(rate), int(rate)))
+            bucket = TokenBucket(rate / 60, capacity=batch_size, tokens=0)
+        results, spent = [], 0.0
+        costs = estimate_case_costs(courts=list(self.pending(ucids))) if budget is not None else {}
+        while True:
+            pending = self.pending(ucids)
+            batches = []
+            for court, ucids in sorted(pending.items()):
+                for batch in partition_all(batch_size or len(ucids), ucids):
+                    batches.append((court, list(batch)))
+            if budget is not None:
+                scheduled, skipped = [], 0
+                for court, batch in batches:
+                    affordable = max(0, int(round(budget - spent, 2) // costs[court])) if costs[court] > 0 else len(batch)
+                    skipped += max(0, len(batch) - affordable)
+                    batch = batch[:affordable]
+                    if batch:
+                        spent += costs[court] * len(batch)
+                        scheduled.append((court, batch))
+                batches = scheduled
+            if len(batches) == 0:
+                if budget is not None and skipped:
+                    print(f'Budget of ${budget:.2f} reached with ${spent:.2f} spent, {skipped} cases were not downloaded')
+                break
+
+            court_batches = {}
+            for court, batch in batches:
+                reserved = costs[court] * len(batch) if budget is not None else 0
+                court_batches.setdefault(court, []).append((batch, reserved))
+
+            def download_court(court):
+                nonlocal spent
+                court_results = []
+                for i, (batch, reserved) in enumerate(court_batches[court]):
+                    estimated_cost = costs[court] * len(batch) if budget is not None else None
+                    if budget is not None:
+                        with self.lock:
+                            # the estimate is updated with the actual cost of earlier batches
+                            if spent - reserved + estimated_cost > budget + 1e-9:
+                                spent -= sum(reserved for _, reserved in court_batches[court][i:])
+                                break
+                    if bucket is not None:
+                        bucket.acquire(len(batch))
+                    result = self.download_batch(court, batch, workers=workers, estimated_cost=estimated_cost)
+                    if budget is not None:
+                        with self.lock:
+                            spent += result['cost'] - reserved
+                            if result['downloaded']:
+                                costs[court] = result['cost'] / result['downloaded']
+                    print(f"{court}: downloaded {result['downloaded']} of {result['cases']} cases in {result['seconds']:.1f}s (${result['cost']:.2f})")
+                    court_results.append(result)
+                return court_results
+
+            with ThreadPoolExecutor(courts) as executor:
+                for future in as_completed([executor.submit(download_court, court) for court in court_batches]):
+                    results += future.result()
+        return results
+
+    def counts(self) -> Dict[str, int]:
+        return pd.Series([case['status'] for case in self.state.values()], dtype=object).value_counts().to_dict()
+
+
+def read_ucids(path: Union[str, Path]) -> List[str]:
+    """Read ucids from a csv with a `ucid` column (or a single column without a header)."""
+    data = pd.read_csv(path, dtype=str)
+    if 'ucid' not in data.columns:
+        data = pd.read_csv(path, dtype=str, header=None, names=['ucid'], usecols=[0])
+    return data['ucid'].dropna().str.strip().tolist()
+
+
+def download_cases(
+    ucids: List[str], workers: int=1, max_attempts: int=3, scraper_cmd: str='pacer-tools scraper',
+    courts: int=1, rate: float=None, budget: float=None, batch_size: int=None, retry_failed: bool=False,
+    resume: bool=False,
+) -> DownloadQueue:
+    """Queue cases and download the ones that are pending.  See `DownloadQueue.run` for the scheduling options.
+
+    Cases that failed in an earlier run stay failed unless `retry_failed` is set.  Only `ucids` are downloaded,
+    unless `resume` is set, in which case cases left pending by earlier runs (e.g. because the budget ran out)
+    are downloaded too.
+    """
+    print('WARNING: this command can spend up to 3$ per case (depending on the number of pages)')
+    queue = DownloadQueue(max_attempts=max_attempts, scraper_cmd=scraper_cmd)
+    queue.add(ucids, retry_failed=retry_failed)
+    queue.run(workers=workers, courts=courts, rate=rate, budget=budget, batch_size=batch_size, ucids=None if resume else ucids)
+    return queue
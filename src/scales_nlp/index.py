@@ -0,0 +1,158 @@
+import os
+import sqlite3
+from pathlib import Path
+from typing import Union, List, Dict
+import pandas as pd
+import scales_nlp
+from scales_nlp import config
+
+
+class PacerIndex():
+    """
+    Persistent SQLite index of the case, html, label and judge files in the PACER_DIR.
+
+    Each file is stored with its ucid, court, year, office, size and mtime.  Refreshing is incremental:
+    a year directory is only re-listed when its mtime has changed since the last refresh, so files that
+    are added or removed are picked up, while files overwritten in place keep their old size and mtime
+    until a `full` refresh.
+    """
+    kinds = ['json', 'html', 'labels', 'judge']
+
+    def __init__(self, path: Union[str, Path]=None):
+        self.path = Path(path) if path is not None else config['PACER_DIR'] / '.scales-nlp-index.sqlite'
+        self.connection = sqlite3.connect(str(self.path))
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS files (
+                ucid TEXT, kind TEXT, court TEXT, year TEXT, office TEXT, directory TEXT,
+                path TEXT, size INTEGER, mtime REAL, PRIMARY KEY (ucid, kind)
+            )
+        """)
+        self.connection.execute("CREATE INDEX IF NOT EXISTS files_court_year ON files (court, year, kind)")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS files_directory ON files (directory)")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS directories (directory TEXT PRIMARY KEY, kind TEXT, court TEXT, mtime REAL)")
+        self.connection.commit()
+
+    def kind_directories(self, kind: str, court: str=None):
+        """Yields (court, year directory) pairs for a file kind."""
+        root = {
+            'json': config['PACER_DIR'],
+            'html': config['PACER_DIR'],
+            'labels': scales_nlp.utils.LABEL_DATA_DIR,
+            'judge': scales_nlp.utils.JUDGE_DATA_DIR,
+        }[kind]
+        court_dirs = [root / court] if court is not None else [x for x in root.iterdir() if x.is_dir() and not x.name.startswith('.')]
+        for court_dir in court_dirs:
+            kind_dir = court_dir if kind == 'judge' else court_dir / kind
+            if not kind_dir.is_dir():
+                continue
+            for year_dir in kind_dir.iterdir():
+                if year_dir.is_dir() and year_dir.name.isdigit():
+                    yield court_dir.name, year_dir
+
+    @staticmethod
+    def path_ucid(kind: str, court: str, path: Path) -> str:
+        if kind == 'judge':
+            return court + ';;' + path.stem[len(court) + 1:].replace('-', ':', 1)
+        return court + ';;' + path.stem.replace('-', ':', 1)
+
+    def refresh(self, court: str=None, full: bool=False) -> Dict[str, int]:
+        """Update the index from the PACER_DIR, only re-listing directories that changed unless `full`.
+
+        :param court: Only refresh this court
+        :param full: Re-list every directory, which also picks up files that were overwritten in place
+        :return: Number of directories that were re-listed for each kind
+        """
+        cursor = self.connection.cursor()
+        known = {}
+        for directory, kind, mtime in cursor.execute(
+                "SELECT directory, kind, mtime FROM directories" + (" WHERE court = ?" if court else ""),
+                (court,) if court else ()):
+            known[directory] = (kind, mtime)
+
+        updated = {kind: 0 for kind in self.kinds}
+        seen = set()
+        for kind in self.kinds:
+            suffix = {'html': '.html', 'judge': '.jsonl'}.get(kind, '.json')
+            for dir_court, year_dir in self.kind_directories(kind, court):
+                directory = str(year_dir)
+                seen.add(directory)
+                mtime = year_dir.stat().st_mtime
+                if not full and directory in known and known[directory][1] == mtime:
+                    continue
+
+                rows = []
+                with os.scandir(year_dir) as entries:
+                    for entry in entries:
+                        if entry.is_file() and entry.name.endswith(suffix):
+                            path = Path(entry.path)
+                            try:
+                                ucid = self.path_ucid(kind, dir_court, path)
+                                _, docket_number, office, year = scales_nlp.get_ucid_components(ucid)
+                                stat = entry.stat()
+                            except (IndexError, OSError):
+                                # temp files and partial downloads that are not named after a docket, or were removed while listing
+                                continue
+                            rows.append((ucid, kind, dir_court, year, office, directory, entry.path, stat.st_size, stat.st_mtime))
+                cursor.execute("DELETE FROM files WHERE directory = ? AND kind = ?", (directory, kind))
+                cursor.executemany("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+                cursor.execute("INSERT OR REPLACE INTO directories VALUES (?, ?, ?, ?)", (directory, kind, dir_court, mtime))
+                updated[kind] += 1
+
+        for directory in set(known) - seen:
+            cursor.execute("DELETE FROM files WHERE directory = ?", (directory,))
+            cursor.execute("DELETE FROM directories WHERE directory = ?", (directory,))
+        self.connection.commit()
+        return updated
+
+    def update_files(self, kind: str, paths: List[Union[str, Path]]):
+        """Re-stat individual files of one kind, e.g. json files that were rewritten in place, and drop those that no longer exist."""
+        cursor = self.connection.cursor()
+        for path in paths:
+            path = Path(path)
+            court = path.parents[1].name if kind == 'judge' else path.parents[2].name
+            ucid = self.path_ucid(kind, court, path)
+            try:
+                _, docket_number, office, year = scales_nlp.get_ucid_components(ucid)
+                stat = path.stat()
+            except IndexError:
+                continue
+            except OSError:
+                cursor.execute("DELETE FROM files WHERE ucid = ? AND kind = ?", (ucid, kind))
+                continue
+            cursor.execute(
+                "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (ucid, kind, court, year, office, str(path.parent), str(path), stat.st_size, stat.st_mtime),
+            )
+        self.connection.commit()
+
+    def query(self, court: str=None, year: Union[str, int]=None, office: str=None, kind: str='json') -> pd.DataFrame:
+        """Indexed files of one kind, optionally filtered by court, year (as it appears in the ucid) and office."""
+        conditions, params = ['kind = ?'], [kind]
+        for column, value in [('court', court), ('year', None if year is None else str(year)[-2:]), ('office', office)]:
+            if value is not None:
+                conditions.append(f'{column} = ?')
+                params.append(str(value))
+        return pd.read_sql_query(
+            "SELECT ucid, court, year, office, path, size, mtime FROM files WHERE " + " AND ".join(conditions) + " ORDER BY ucid",
+            self.connection, params=params,
+        )
+
+    def ucids(self, court: str=None, year: Union[str, int]=None, office: str=None, kind: str='json') -> List[str]:
+        return self.query(court=court, year=year, office=office, kind=kind)['ucid'].tolist()
+
+    def paths(self, ucid: str) -> Dict[str, Path]:
+        rows = self.connection.execute("SELECT kind, path FROM files WHERE ucid = ?", (ucid,)).fetchall()
+        return {kind: Path(path) for kind, path in rows}
+
+
+_pacer_index = None
+
+
+def pacer_index(refresh: bool=True) -> PacerIndex:
+    """Returns the index for the configured PACER_DIR, refreshed incrementally the first time it is used."""
+    global _pacer_index
+    if _pacer_index is None:
+        _pacer_index = PacerIndex()
+        if refresh:
+            _pacer_index.refresh()
+    return _pacer_index
@@ -141,15 +141,31 @@ class ClassificationPipeline(BasePipeline):
 
 
 class MultiLabelClassificationPipeline(ClassificationPipeline):
-    def batch_predict(self, inputs, return_scores=False, prediction_threshold=0.5, **kwargs):
+    @property
+    def prediction_thresholds(self) -> torch.Tensor:
+        """Per-label thresholds calibrated during training and stored in the model config, 0.5 for any label without one."""
+        if not hasattr(self, '_prediction_thresholds'):
+            thresholds = getattr(self.model.config, 'prediction_thresholds', None) or {}
+            id2label = self.model.config.id2label
+            self._prediction_thresholds = torch.tensor([thresholds.get(id2label[i], 0.5) for i in range(len(id2label))])
+        return self._prediction_thresholds
+
+    def batch_predict(self, inputs, return_scores=False, prediction_threshold=None, **kwargs):
+        """Predict labels for a batch of inputs.
+
+        :param return_scores: Whether to return the score of every label instead of the predicted labels
+        :param prediction_threshold: Score above which a label is predicted, if None the per-label thresholds from the model config are used
+        """
         outputs = self.model(**inputs)
         logits = outputs.logits.detach().cpu()
         scores = torch.sigmoid(logits)
+        thresholds = self.prediction_thresholds if prediction_threshold is None else prediction_threshold
+        predicted = (scores > thresholds).tolist()
         predictions = []
         for i in range(len(scores)):
             prediction = {self.model.config.id2label[label_id]: score.item() for label_id, score in enumerate(scores[i])}
             if not return_scores:
-                prediction = [label for label, score in prediction.items() if score > prediction_threshold]
+                prediction = [label for label, is_predicted in zip(prediction, predicted[i]) if is_predicted]
             predictions.append(prediction)
         return predictions
 
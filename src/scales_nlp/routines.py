@@ -1,19 +1,359 @@
-from transformers import AutoTokenizer, AutoModel, AutoModelForSequenceClassification
-from transformers import AutoModelForTokenClassification, DataCollatorForTokenClassification
+from transformers import AutoConfig, AutoTokenizer, AutoModel, AutoModelForSequenceClassification
+from transformers import AutoModelForTokenClassification, DataCollatorForTokenClassification, DataCollatorWithPadding
 from transformers import TrainingArguments, Trainer
+from transformers import EarlyStoppingCallback, TrainerCallback
+from transformers.trainer import OPTIMIZER_NAME, SCHEDULER_NAME
+from transformers.trainer_utils import PREFIX_CHECKPOINT_DIR, get_last_checkpoint
 from transformers.integrations import TensorBoardCallback
-from datasets import Dataset
-import evaluate
+from datasets import Dataset, Value
 from sklearn.feature_extraction.text import CountVectorizer
-from sklearn.metrics import f1_score as sk_f1_score
 import torch
 import pandas as pd
 import numpy as np
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+import itertools
+import json
+import multiprocessing
+import os
+import re
 import shutil
+import sys
+import time
 from scales_nlp import config
 import scales_nlp
 
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+def safe_divide(a, b):
+    a, b = np.asarray(a, dtype=float), np.asarray(b, dtype=float)
+    return np.divide(a, b, out=np.zeros(np.broadcast(a, b).shape), where=b != 0)
+
+
+def classification_scores(labels, predictions, num_labels):
+    """Accuracy, precision, recall and f1 from a confusion matrix, for the positive class when there are two labels and macro averaged otherwise."""
+    confusion = np.bincount(labels * num_labels + predictions, minlength=num_labels ** 2).reshape(num_labels, num_labels)
+    true_positives = np.diag(confusion)
+    predicted = confusion.sum(axis=0)
+    actual = confusion.sum(axis=1)
+    precision = safe_divide(true_positives, predicted)
+    recall = safe_divide(true_positives, actual)
+    f1 = safe_divide(2 * true_positives, predicted + actual)
+    if num_labels == 2:
+        present = np.array([False, True])
+    else:
+        present = (predicted + actual) > 0
+    return {
+        'accuracy': float(true_positives.sum() / max(confusion.sum(), 1)),
+        'f1': float(f1[present].mean()),
+        'precision': float(precision[present].mean()),
+        'recall': float(recall[present].mean()),
+    }
+
+
+def threshold_sweep(probs, labels, thresholds):
+    """
+    True positives, predicted positives and actual positives of each label (rows) at each threshold (columns).
+
+    Every probability is binned between the sorted thresholds once, and the counts above each threshold are
+    the reverse cumulative sums of the bins, so the sweep is a single pass over the predictions.
+    """
+    num_labels = probs.shape[1]
+    bins = np.searchsorted(thresholds, probs, side='left') + np.arange(num_labels) * (len(thresholds) + 1)
+    counts = np.bincount(bins.ravel(), minlength=num_labels * (len(thresholds) + 1)).reshape(num_labels, -1)
+    positive_counts = np.bincount(bins.ravel(), weights=labels.ravel(), minlength=num_labels * (len(thresholds) + 1)).reshape(num_labels, -1)
+    # a probability is above thresholds[k] when its bin is greater than k
+    predicted = np.cumsum(counts[:, ::-1], axis=1)[:, ::-1][:, 1:]
+    true_positives = np.cumsum(positive_counts[:, ::-1], axis=1)[:, ::-1][:, 1:]
+    actual = labels.sum(axis=0)[:, None]
+    return true_positives, predicted, actual
+
+
+class PaddingCollator():
+    """
+    Wraps a data collator that pads each batch to its longest example, and counts the examples and the real and
+    padded tokens.  The Trainer uses the same collator for evaluation, add `PaddingCallback` to the trainer to only
+    count training batches.
+    """
+    def __init__(self, collator):
+        self.collator = collator
+        self.examples = 0
+        self.tokens = 0
+        self.padded_tokens = 0
+
+    @property
+    def counts(self):
+        return np.array([self.examples, self.tokens, self.padded_tokens])
+
+    def exclude(self, counts):
+        """Remove collated batches, given as a (examples, tokens, padded tokens) difference of `counts`, from the totals."""
+        self.examples, self.tokens, self.padded_tokens = (self.counts - counts).tolist()
+
+    def __call__(self, features):
+        features = [{k: v for k, v in feature.items() if k != 'length'} for feature in features]
+        batch = self.collator(features)
+        self.examples += len(features)
+        self.tokens += int(batch['attention_mask'].sum())
+        self.padded_tokens += batch['attention_mask'].numel()
+        return batch
+
+    @property
+    def padding_efficiency(self):
+        """Share of the tokens in all counted batches that are not padding."""
+        return self.tokens / self.padded_tokens if self.padded_tokens else None
+
+
+class PaddingCallback(TrainerCallback):
+    """
+    Removes evaluation batches from the counts of a `PaddingCollator`.
+
+    Training batches are only collated when the trainer fetches the next batch, so everything collated between
+    the end of the last step and an evaluation belongs to that evaluation.
+    """
+    def __init__(self, collator):
+        self.collator = collator
+        self.step_counts = collator.counts
+
+    def on_step_end(self, args, state, control, **kwargs):
+        self.step_counts = self.collator.counts
+
+    def on_evaluate(self, args, state, control, **kwargs):
+        self.collator.exclude(self.collator.counts - self.step_counts)
+        self.step_counts = self.collator.counts
+
+
+def peak_rss_mb():
+    """Peak resident memory of the training process in MB, or None where the resource module is unavailable."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 2 ** 10
+
+
+class PerformanceCallback(TrainerCallback):
+    """
+    Adds throughput and resource metrics to each training log.
+
+    Examples and tokens are counted by the `PaddingCollator` of the training run (without evaluation batches, see
+    `PaddingCallback`), and the time of each step is
+    split into waiting for the dataloader (from the end of one step to the start of the next, excluding
+    evaluation and checkpoints) and compute (from the start to the end of the step, including every gradient
+    accumulation step after the first batch).  The callback should be the first callback of the trainer so the
+    reporting callbacks see its metrics.
+
+    :param collator: The `PaddingCollator` of the trainer
+    :param profile_steps: Optional (first, last) steps to record with `torch.profiler`, the trace is exported to
+        the `profile` directory of the output directory and can be opened in chrome://tracing or Perfetto
+    """
+    def __init__(self, collator, profile_steps=None):
+        self.collator = collator
+        self.profile_steps = profile_steps
+        self.profiler = None
+        self.reset()
+
+    def reset(self):
+        self.counts = self.collator.counts
+        self.dataloader_seconds = 0.0
+        self.compute_seconds = 0.0
+        self.step_end = time.perf_counter()
+
+    def start_profiler(self, state):
+        if self.profile_steps is None or self.profiler is not None:
+            return
+        first, last = self.profile_steps
+        # started at the end of the previous step, so the dataloader time of the first step is recorded too
+        if first <= state.global_step + 1 <= last:
+            activities = [torch.profiler.ProfilerActivity.CPU]
+            if torch.cuda.is_available():
+                activities.append(torch.profiler.ProfilerActivity.CUDA)
+            self.profiler = torch.profiler.profile(activities=activities, record_shapes=True, profile_memory=True)
+            self.profiler.start()
+            self.profile_start = state.global_step + 1
+
+    def stop_profiler(self, args, state):
+        self.profiler.stop()
+        trace_path = Path(args.output_dir) / 'profile' / f'trace-steps-{self.profile_start}-{state.global_step}.json'
+        trace_path.parent.mkdir(parents=True, exist_ok=True)
+        self.profiler.export_chrome_trace(str(trace_path))
+        print(self.profiler.key_averages().table(sort_by='self_cpu_time_total', row_limit=15))
+        print('Profiler trace saved to', trace_path)
+        self.profiler = None
+        self.profile_steps = None
+
+    def on_train_begin(self, args, state, control, **kwargs):
+        self.reset()
+        self.start_profiler(state)
+
+    def on_step_begin(self, args, state, control, **kwargs):
+        self.step_begin = time.perf_counter()
+        self.dataloader_seconds += self.step_begin - self.step_end
+
+    def on_step_end(self, args, state, control, **kwargs):
+        self.step_end = time.perf_counter()
+        self.compute_seconds += self.step_end - self.step_begin
+        if self.profiler is not None and state.global_step >= self.profile_steps[1]:
+            self.stop_profiler(args, state)
+        self.start_profiler(state)
+
+    def on_evaluate(self, args, state, control, **kwargs):
+        self.step_end = time.perf_counter()
+
+    def on_log(self, args, state, control, logs=None, **kwargs):
+        if logs is None or 'loss' not in logs:
+            return
+        seconds = self.dataloader_seconds + self.compute_seconds
+        examples, tokens, padded_tokens = (self.collator.counts - self.counts).tolist()
+        metrics = {
+            'samples_per_second': examples / seconds if seconds else None,
+            'tokens_per_second': tokens / seconds if seconds else None,
+            'padding_ratio': 1 - tokens / padded_tokens if padded_tokens else None,
+            'dataloader_seconds': self.dataloader_seconds,
+            'compute_seconds': self.compute_seconds,
+            'dataloader_ratio': self.dataloader_seconds / seconds if seconds else None,
+            'peak_rss_mb': peak_rss_mb(),
+        }
+        if torch.cuda.is_available():
+            metrics['peak_cuda_memory_mb'] = torch.cuda.max_memory_allocated() / 2 ** 20
+        metrics = {k: round(v, 4) for k, v in metrics.items() if v is not None}
+        logs.update(metrics)
+        if state.log_history:
+            state.log_history[-1].update(metrics)
+        self.reset()
+
+    def on_save(self, args, state, control, **kwargs):
+        self.step_end = time.perf_counter()
+
+    def on_train_end(self, args, state, control, **kwargs):
+        if self.profiler is not None:
+            self.stop_profiler(args, state)
+
+
+CHECKPOINT_COMPLETE_NAME = 'checkpoint-complete'
+TRAINING_STATE_NAME = '.scales-nlp-training.json'
+
+
+def to_cpu(obj, copies=None):
+    """Copy every tensor in a (nested) state dict to the cpu, keeping tensors that share memory shared."""
+    copies = {} if copies is None else copies
+    if isinstance(obj, torch.Tensor):
+        key = (obj.data_ptr(), obj.dtype, tuple(obj.shape), tuple(obj.stride()))
+        if key not in copies:
+            copies[key] = obj.detach().to('cpu', copy=True)
+        return copies[key]
+    elif isinstance(obj, dict):
+        return type(obj)((k, to_cpu(v, copies)) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple)):
+        return type(obj)(to_cpu(v, copies) for v in obj)
+    return obj
+
+
+def last_checkpoint(output_dir, marked_only=False):
+    """
+    Latest checkpoint in an output directory that was completely written, or None if there is none.
+
+    :param marked_only: Only consider checkpoints with a completion marker, which is required when any checkpoint
+        in the directory was written in the background, since an unmarked one may be incomplete
+    """
+    checkpoints = [path for path in Path(output_dir).glob(PREFIX_CHECKPOINT_DIR + '-*') if path.is_dir() and path.name.split('-')[-1].isdigit()]
+    checkpoints = sorted(checkpoints, key=lambda path: int(path.name.split('-')[-1]))
+    complete = [path for path in checkpoints if (path / CHECKPOINT_COMPLETE_NAME).exists()]
+    if complete:
+        return str(complete[-1])
+    if marked_only:
+        return None
+    # checkpoints of synchronous runs from before completion markers were added
+    return get_last_checkpoint(str(output_dir)) if checkpoints else None
+
+
+class CheckpointMarkerCallback(TrainerCallback):
+    """Marks each checkpoint as complete once the Trainer has saved it synchronously."""
+    def on_save(self, args, state, control, **kwargs):
+        checkpoint_dir = Path(args.output_dir, f'{PREFIX_CHECKPOINT_DIR}-{state.global_step}')
+        if checkpoint_dir.is_dir():
+            (checkpoint_dir / CHECKPOINT_COMPLETE_NAME).touch()
+
+
+class AsyncCheckpointTrainer(Trainer):
+    """
+    Trainer that writes checkpoints in a background thread.
+
+    At each checkpoint the model, optimizer and scheduler states are copied to the cpu and training continues
+    while they are written to disk.  Writes happen in order in a single thread, a marker file is added to each
+    checkpoint once all of its files are written, and checkpoints are only rotated after that.  Other saves,
+    such as `save_model` and `push_to_hub`, wait for pending writes and are synchronous.  Errors in the
+    background thread are raised at the next save or by `wait_for_saves`.
+
+    This overrides private Trainer methods, use `is_supported` to check that the installed transformers has them.
+    """
+    overridden_methods = ['_save_checkpoint', '_save', '_save_optimizer_and_scheduler', '_rotate_checkpoints', '_load_best_model']
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.save_executor = ThreadPoolExecutor(1)
+        self.pending_saves = []
+        self.saving_checkpoint = False
+
+    @classmethod
+    def is_supported(cls):
+        return all(callable(getattr(Trainer, name, None)) for name in cls.overridden_methods)
+
+    def submit_save(self, fn, *args, **kwargs):
+        for future in [future for future in self.pending_saves if future.done()]:
+            self.pending_saves.remove(future)
+            future.result()
+        self.pending_saves.append(self.save_executor.submit(fn, *args, **kwargs))
+
+    def wait_for_saves(self):
+        while self.pending_saves:
+            self.pending_saves.pop(0).result()
+
+    def _save_checkpoint(self, *args, **kwargs):
+        self.saving_checkpoint = True
+        try:
+            return super()._save_checkpoint(*args, **kwargs)
+        finally:
+            self.saving_checkpoint = False
+
+    def save_model(self, *args, **kwargs):
+        self.wait_for_saves()
+        return super().save_model(*args, **kwargs)
+
+    def push_to_hub(self, *args, **kwargs):
+        self.wait_for_saves()
+        return super().push_to_hub(*args, **kwargs)
+
+    def _save(self, output_dir=None, state_dict=None):
+        if not self.saving_checkpoint:
+            self.wait_for_saves()
+            return super()._save(output_dir, state_dict=state_dict)
+        output_dir = output_dir if output_dir is not None else self.args.output_dir
+        os.makedirs(output_dir, exist_ok=True)
+        state_dict = to_cpu(state_dict if state_dict is not None else self.model.state_dict())
+        self.submit_save(super()._save, output_dir, state_dict=state_dict)
+
+    def _save_optimizer_and_scheduler(self, output_dir):
+        if not self.saving_checkpoint or self.is_deepspeed_enabled or self.is_fsdp_enabled or not self.args.should_save:
+            return super()._save_optimizer_and_scheduler(output_dir)
+        optimizer_state = to_cpu(self.optimizer.state_dict())
+        scheduler_state = to_cpu(self.lr_scheduler.state_dict())
+        self.submit_save(torch.save, optimizer_state, os.path.join(output_dir, OPTIMIZER_NAME))
+        self.submit_save(torch.save, scheduler_state, os.path.join(output_dir, SCHEDULER_NAME))
+
+    def _rotate_checkpoints(self, use_mtime=False, output_dir=None):
+        checkpoint_dir = os.path.join(output_dir or self.args.output_dir, f'{PREFIX_CHECKPOINT_DIR}-{self.state.global_step}')
+        if os.path.isdir(checkpoint_dir):
+            self.submit_save(Path(checkpoint_dir, CHECKPOINT_COMPLETE_NAME).touch)
+        self.submit_save(super()._rotate_checkpoints, use_mtime=use_mtime, output_dir=output_dir)
+
+    def _load_best_model(self):
+        self.wait_for_saves()
+        return super()._load_best_model()
+
 
 class BaseRoutine():
     def __init__(
@@ -23,7 +363,8 @@ class BaseRoutine():
         gradient_accumulation_steps=config['GRADIENT_ACCUMULATION_STEPS'],
         learning_rate=config['LEARNING_RATE'], warmup_ratio=config['WARMUP_RATIO'],
         weight_decay=config['WEIGHT_DECAY'], save_steps=config['SAVE_STEPS'],
-        callbacks=None, **kwargs
+        group_by_length=config['GROUP_BY_LENGTH'], async_checkpoints=config['ASYNC_CHECKPOINTS'], profile=False, profile_steps=(10, 15),
+        metric_for_best_model=None, greater_is_better=None, callbacks=None, **kwargs
     ):
         self.model_name = model_name
         self.max_length = max_length
@@ -37,51 +378,157 @@ class BaseRoutine():
         self.warmup_ratio = warmup_ratio
         self.weight_decay = weight_decay
         self.save_steps = save_steps
+        self.group_by_length = group_by_length
+        self.async_checkpoints = async_checkpoints
+        self.profile = profile
+        self.profile_steps = profile_steps
+        self.metric_for_best_model = metric_for_best_model
+        self.greater_is_better = greater_is_better
         self.callbacks = callbacks
         self.kwargs = kwargs
 
+    def parse_labels(self, labels):
+        """Hook for converting raw label values, such as strings read from a data file, into the labels of the task."""
+        return labels
+
+    def get_label_names(self, labels):
+        raise NotImplementedError('get_label_names not implemented')
+
+    def drop_unlabeled(self, data):
+        """Hook for removing examples without a label (a null label value) before training, by default none are removed."""
+        return data
+
+    def encode_labels(self, labels):
+        raise NotImplementedError('encode_labels not implemented')
+
     def process_labels(self, labels):
-        raise NotImplementedError('process_labels not implemented')
+        self.label_names = self.get_label_names(labels)
+        return self.encode_labels(labels), self.label_names
+
+    def collect_label_names(self, data, batch_size=10000):
+        label_names = set()
+        for batch in data.select_columns(['label']).iter(batch_size=batch_size):
+            label_names.update(self.get_label_names(self.parse_labels(batch['label'])))
+        return list(sorted(label_names))
 
     def load_model(self, model_name):
         raise NotImplementedError('load_model not implemented')
 
-    def create_dataset(self, texts, labels, name):
-        inputs = self.tokenizer(texts, padding="max_length", max_length=self.max_length, truncation=True)
-        inputs['labels'] = torch.Tensor(labels).reshape(len(texts), -1)
-        return Dataset.from_dict(inputs)
+    def encode_batch(self, batch):
+        inputs = self.tokenizer(batch['text'], max_length=self.max_length, truncation=True)
+        labels = self.encode_labels(self.parse_labels(batch['label']))
+        inputs['labels'] = np.array(labels, dtype=np.float32).reshape(len(batch['text']), -1)
+        inputs['length'] = [len(input_ids) for input_ids in inputs['input_ids']]
+        return dict(inputs)
+
+    def create_dataset(self, data, fingerprint):
+        """Tokenize a dataset with `text` and `label` columns in chunks, cached on disk under the data fingerprint and routine settings."""
+        fingerprint = scales_nlp.datasets.data_fingerprint(
+            type(self).__name__, fingerprint, scales_nlp.datasets.tokenizer_fingerprint(self.tokenizer),
+            self.max_length, self.label_names, getattr(self, 'multi_label_delimiter', None),
+        )
+        return scales_nlp.datasets.cached_map(data, self.encode_batch, fingerprint, desc='Tokenizing')
+
+    @property
+    def data_collator(self):
+        return DataCollatorWithPadding(self.tokenizer)
     
+    def calibrate(self, model):
+        """Hook for storing settings calibrated on the final evaluation in the model config before it is saved."""
+        pass
+
     def load_trainer_class(self):
+        trainer_class = AsyncCheckpointTrainer if self.async_checkpoints else Trainer
         if hasattr(self, 'compute_loss'):
             compute_loss_fn = self.compute_loss
-            class CustomTrainer(Trainer):
+            class CustomTrainer(trainer_class):
                 def compute_loss(self, *args, **kwargs):
                     return compute_loss_fn(*args, **kwargs)
             return CustomTrainer
         else:
-            return Trainer
+            return trainer_class
+
+    def train(self, output_dir, texts, labels, push=None, overwrite=False, resume=False):
+        texts, labels = list(texts), list(labels)
+        data = Dataset.from_dict({'text': texts, 'label': labels})
+        fingerprint = scales_nlp.datasets.data_fingerprint(texts, labels)
+        return self.train_dataset(output_dir, data, fingerprint, push=push, overwrite=overwrite, resume=resume)
 
-    def train(self, output_dir, texts, labels, push=None, overwrite=False):
-        labels, label_names = self.process_labels(labels)
-        self.label_names = label_names
+    def load_data_file(self, data_path, text_col='text', label_col='label'):
+        """Load a csv, parquet or json lines file as an Arrow dataset with `text` and `label` columns, without reading it into memory."""
+        data = scales_nlp.datasets.load_data_file(data_path)
+        columns = {text_col: 'text'} if label_col is None else {text_col: 'text', label_col: 'label'}
+        data = data.select_columns(list(columns))
+        data = data.rename_columns({k: v for k, v in columns.items() if k != v})
+        if 'label' in data.column_names and isinstance(data.features['label'], Value) and data.features['label'].dtype != 'string':
+            data = data.cast_column('label', Value('string'))
+        return data
 
+    def train_from_file(self, output_dir, data_path, text_col='text', label_col='label', push=None, overwrite=False, resume=False):
+        """Train from a csv, parquet or json lines file, which is streamed into an Arrow dataset instead of being read into memory."""
+        data = self.load_data_file(data_path, text_col=text_col, label_col=label_col)
+        return self.train_dataset(output_dir, data, data._fingerprint, push=push, overwrite=overwrite, resume=resume)
+
+    def prepare_dataset(self, data, fingerprint):
+        """Collect the label names, load the tokenizer and tokenize the dataset, or read it from the dataset cache."""
+        data = self.drop_unlabeled(data)
+        self.label_names = self.collect_label_names(data)
         self.tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+        return self.create_dataset(data, fingerprint)
+
+    def prepare_output_dir(self, output_dir, fingerprint, overwrite=False, resume=False):
+        """
+        Create the output directory and return the seed of the train/eval split and the checkpoint to resume from.
+
+        The seed and a fingerprint of the data are saved in the output directory, so a resumed run splits and
+        shuffles the (cached) dataset exactly like the interrupted one.
+
+        :param overwrite: Delete the output directory if it exists
+        :param resume: Continue from the latest complete checkpoint if the output directory exists
+        :return: The split seed and the checkpoint path, which is None when training starts from scratch
+        """
+        state_path = output_dir / TRAINING_STATE_NAME
+        fingerprint = scales_nlp.datasets.data_fingerprint(type(self).__name__, fingerprint, self.eval_split, self.shuffle)
+        if output_dir.exists():
+            if resume and state_path.exists():
+                state = scales_nlp.load_json(state_path)
+                if state['fingerprint'] != fingerprint:
+                    raise Exception("Can't resume training in an output directory that was trained on different data or split settings, please use the overwrite argument to overwrite it")
+                checkpoint = last_checkpoint(output_dir, marked_only=state.get('async_checkpoints', False))
+                print('Resuming training from', checkpoint if checkpoint is not None else 'the start, no complete checkpoint was found')
+                if self.async_checkpoints and not state.get('async_checkpoints', False):
+                    state['async_checkpoints'] = True
+                    scales_nlp.save_json(state_path, state)
+                return state['seed'], checkpoint
+            elif overwrite:
+                shutil.rmtree(output_dir)
+            elif resume:
+                raise Exception("Output directory was not created by a resumable training run, please use the overwrite argument to overwrite it")
+            else:
+                raise Exception("Output directory already exists, please use the resume argument to continue training or the overwrite argument to overwrite it")
+
+        seed = int(np.random.randint(2 ** 31))
+        output_dir.mkdir(parents=True)
+        scales_nlp.save_json(state_path, {'seed': seed, 'fingerprint': fingerprint, 'async_checkpoints': self.async_checkpoints})
+        return seed, None
+
+    def train_dataset(self, output_dir, data, fingerprint, push=None, overwrite=False, resume=False):
+        output_dir = Path(output_dir)
+        if self.async_checkpoints and not AsyncCheckpointTrainer.is_supported():
+            print('WARNING: async checkpoints are not supported by this version of transformers, checkpoints will be saved synchronously')
+            self.async_checkpoints = False
+        seed, checkpoint = self.prepare_output_dir(output_dir, fingerprint, overwrite=overwrite, resume=resume)
+        dataset = self.prepare_dataset(data, fingerprint)
         model = self.load_model(self.model_name)
 
-        if self.shuffle:
-            data = list(zip(texts, labels))
-            np.random.shuffle(data)
-            texts, labels = zip(*data)
-            texts, labels = list(texts), list(labels)
-        
-        split = len(texts) - int(self.eval_split * len(texts))
-        
-        train_dataset = self.create_dataset(texts[:split], labels[:split], 'train')
-        eval_dataset = self.create_dataset(texts[split:], labels[split:], 'eval')
+        order = np.random.default_rng(seed).permutation(len(dataset)) if self.shuffle else np.arange(len(dataset))
+        split = len(dataset) - int(self.eval_split * len(dataset))
+
+        train_dataset = dataset.select(order[:split])
+        eval_dataset = dataset.select(order[split:])
 
         trainer_class = self.load_trainer_class()
 
-        output_dir = Path(output_dir)
         args = TrainingArguments(
             output_dir,
             num_train_epochs=self.epochs,
@@ -96,7 +543,11 @@ class BaseRoutine():
             save_steps=self.save_steps,
             evaluation_strategy='steps',
             load_best_model_at_end=True,
+            metric_for_best_model=self.metric_for_best_model,
+            greater_is_better=self.greater_is_better,
             save_total_limit=5,
+            group_by_length=self.group_by_length,
+            length_column_name='length',
             logging_steps=5,
             logging_dir=output_dir / 'runs',
             hub_strategy='end',
@@ -105,12 +556,6 @@ class BaseRoutine():
             push_to_hub=push is not None,
         )
 
-        if output_dir.exists():
-            if overwrite:
-                shutil.rmtree(output_dir)
-            else:
-                raise Exception("Output directory already exists, please use the overwrite argument to overwrite it")
-
         trainer_class_args = dict(
             model=model,
             tokenizer=self.tokenizer,
@@ -122,10 +567,11 @@ class BaseRoutine():
         if hasattr(self, 'compute_metrics'):
             trainer_class_args['compute_metrics'] = self.compute_metrics
         
-        if hasattr(self, 'data_collator'):
-            trainer_class_args['data_collator'] = self.data_collator
+        self.collator = PaddingCollator(self.data_collator)
+        trainer_class_args['data_collator'] = self.collator
 
         self.trainer = trainer_class(**trainer_class_args)
+        self.trainer.add_callback(PaddingCallback(self.collator))
 
         if self.callbacks is None:
             self.callbacks = [TensorBoardCallback()]
@@ -133,20 +579,40 @@ class BaseRoutine():
         for callback in self.callbacks:
             self.trainer.add_callback(callback)
 
-        self.trainer.train()
+        if not isinstance(self.trainer, AsyncCheckpointTrainer):
+            self.trainer.add_callback(CheckpointMarkerCallback())
+
+        if self.profile:
+            # first, so the reporting callbacks see its metrics
+            self.performance_callback = PerformanceCallback(self.collator, profile_steps=self.profile_steps)
+            self.trainer.callback_handler.callbacks.insert(0, self.performance_callback)
+
+        self.trainer.train(resume_from_checkpoint=checkpoint)
         results = self.trainer.evaluate()
+        results['padding_efficiency'] = self.collator.padding_efficiency
+        self.trainer.log({'padding_efficiency': results['padding_efficiency']})
         print(results)
 
+        self.calibrate(self.trainer.model)
         self.trainer.save_model(output_dir)
         print("Model saved to", output_dir.resolve())
         return results
         
 
 class ClassificationRoutine(BaseRoutine):    
-    def process_labels(self, labels):
-        label_names = list(sorted(list(set(labels))))
-        labels = [[int(label_names[i] == label) for i in range(len(label_names))] for label in labels]
-        return labels, label_names
+    def drop_unlabeled(self, data):
+        if 'label' not in data.column_names:
+            return data
+        labeled = data.filter(lambda labels: [label is not None for label in labels], input_columns='label', batched=True)
+        if len(labeled) < len(data):
+            print(f'Dropping {len(data) - len(labeled)} examples without a label')
+        return labeled
+
+    def get_label_names(self, labels):
+        return list(sorted(list(set(labels))))
+
+    def encode_labels(self, labels):
+        return [[int(self.label_names[i] == label) for i in range(len(self.label_names))] for label in labels]
 
     def load_model(self, model_name):
         model = AutoModelForSequenceClassification.from_pretrained(model_name, num_labels=len(self.label_names))
@@ -155,28 +621,33 @@ class ClassificationRoutine(BaseRoutine):
         return model
     
     def compute_metrics(self, eval_pred):
-        acc_metric = evaluate.load("accuracy")
-        f1_metric = evaluate.load("f1")
-        precision_metric = evaluate.load("precision")
-        recall_metric = evaluate.load("recall")
-
         logits, labels = eval_pred
-        logits = torch.softmax(torch.Tensor(logits), dim=-1).numpy()
         predictions = np.argmax(logits, axis=-1)
         labels = np.argmax(labels, axis=-1)
-        return {
-            'accuracy': acc_metric.compute(predictions=predictions, references=labels)['accuracy'],
-            'f1': f1_metric.compute(predictions=predictions, references=labels)['f1'],
-            'precision': precision_metric.compute(predictions=predictions, references=labels)['precision'],
-            'recall': recall_metric.compute(predictions=predictions, references=labels)['recall'],
-        }
+        return classification_scores(labels, predictions, len(self.label_names))
 
 
 class MultiLabelClassificationRoutine(ClassificationRoutine):
-    def process_labels(self, labels):
-        label_names = list(sorted(list(set([label for label_set in labels for label in label_set]))))
-        labels = [[int(label_names[i] in label_set) for i in range(len(label_names))] for label_set in labels]
-        return labels, label_names
+    def __init__(self, multi_label_delimiter='|', **kwargs):
+        super().__init__(**kwargs)
+        self.multi_label_delimiter = multi_label_delimiter
+
+    def drop_unlabeled(self, data):
+        # a null label is an example without any of the labels
+        return data
+
+    def parse_labels(self, labels):
+        return [
+            [x for x in label_set.split(self.multi_label_delimiter) if x != ''] if isinstance(label_set, str)
+            else [] if label_set is None else label_set
+            for label_set in labels
+        ]
+
+    def get_label_names(self, labels):
+        return list(sorted(list(set([label for label_set in labels for label in label_set]))))
+
+    def encode_labels(self, labels):
+        return [[int(self.label_names[i] in label_set) for i in range(len(self.label_names))] for label_set in labels]
 
     def compute_loss(self, model, inputs, return_outputs=False):
         labels = inputs.pop("labels")
@@ -186,24 +657,58 @@ class MultiLabelClassificationRoutine(ClassificationRoutine):
         loss = loss_fct(logits, labels.float())
         return (loss, outputs) if return_outputs else loss
     
+    thresholds = np.round(np.arange(0.01, 1.0, 0.01), 2)
+
     def compute_metrics(self, eval_pred):
         logits, labels = eval_pred
-        logits = torch.sigmoid(torch.Tensor(logits)).numpy()
-        predictions = (logits > 0.5).astype(int)
-        scores = sk_f1_score(predictions, labels, average=None)
-        scores = {'labels': {self.label_names[i]: scores[i] for i in range(len(scores))}}
-        scores['f1_macro'] = sk_f1_score(predictions, labels, average='macro')
+        probs = torch.sigmoid(torch.Tensor(logits)).numpy()
+        true_positives, predicted, actual = threshold_sweep(probs, labels, self.thresholds)
+        precision = safe_divide(true_positives, predicted)
+        recall = safe_divide(true_positives, actual)
+        f1 = safe_divide(2 * true_positives, predicted + actual)
+
+        default = np.flatnonzero(self.thresholds == 0.5)[0]
+        # the best threshold of each label, closest to 0.5 among ties
+        ties = f1 >= f1.max(axis=1, keepdims=True)
+        best = np.argmin(np.where(ties, np.abs(self.thresholds - 0.5), np.inf), axis=1)
+        label_index = np.arange(len(self.label_names))
+        scores = {'labels': {
+            self.label_names[i]: {
+                'precision': precision[i, default], 'recall': recall[i, default], 'f1': f1[i, default],
+                'support': int(actual[i, 0]), 'best_threshold': self.thresholds[best[i]], 'best_f1': f1[i, best[i]],
+            }
+            for i in label_index
+        }}
+        scores['f1_macro'] = f1[:, default].mean()
+        scores['precision_macro'] = precision[:, default].mean()
+        scores['recall_macro'] = recall[:, default].mean()
+        scores['f1_macro_best_thresholds'] = f1[label_index, best].mean()
+
+        # labels without examples in the eval set keep the default threshold
+        self.calibrated_thresholds = {
+            self.label_names[i]: float(self.thresholds[best[i]]) if actual[i, 0] > 0 else 0.5
+            for i in label_index
+        }
         return scores
 
+    def calibrate(self, model):
+        """Store the per-label thresholds with the best f1 on the final evaluation in the model config, where the multi-label pipeline reads them."""
+        model.config.prediction_thresholds = self.calibrated_thresholds
+
 
 class TokenClassificationRoutine(BaseRoutine):    
-    def process_labels(self, labels):
+    def parse_labels(self, labels):
+        return [json.loads(spans) if isinstance(spans, str) else [] if spans is None else spans for spans in labels]
+
+    def get_label_names(self, labels):
         label_names = []
         for spans in labels:
             for span in spans:
                 label_names.append(span['label'])
-        label_names = list(sorted(list(set(label_names))))
-        return labels, label_names
+        return list(sorted(list(set(label_names))))
+
+    def encode_labels(self, labels):
+        return labels
 
     def load_model(self, model_name):
         id2label = {0: 'O'}
@@ -216,19 +721,308 @@ class TokenClassificationRoutine(BaseRoutine):
         model.config.label2id = {v:k for k,v in id2label.items()}
         return model
 
-    def create_dataset(self, texts, labels, name):
-        return scales_nlp.datasets.TokenClassificationDataset(self.tokenizer, texts, labels, self.label_names, max_length=self.max_length)
+    def encode_batch(self, batch):
+        label_map = scales_nlp.datasets.bio_label_map(self.label_names)
+        return scales_nlp.datasets.tokenize_spans(self.tokenizer, batch['text'], self.parse_labels(batch['label']), label_map, max_length=self.max_length)
 
     @property
     def data_collator(self):
         return DataCollatorForTokenClassification(self.tokenizer)
 
 
+class DistillationRoutine(MultiLabelClassificationRoutine):
+    """
+    Distill a multi-label teacher, such as the docket classifier, into a smaller student over unlabeled text.
+
+    The student uses the teacher's config and tokenizer with fewer layers (and optionally a smaller hidden size),
+    and when the hidden size is unchanged it is initialized from evenly spaced teacher layers.  The teacher's logits
+    are computed once and cached on disk with the tokenized dataset, and the student is trained on the teacher's
+    sigmoid scores.  Evaluation reports agreement with the teacher's labels and the speed of both models.
+    """
+    def __init__(
+        self, teacher_name='scales-okn/docket-classification', student_layers=4, student_hidden_size=None,
+        temperature=1.0, teacher_batch_size=32, **kwargs
+    ):
+        kwargs['model_name'] = teacher_name
+        super().__init__(**kwargs)
+        self.teacher_name = teacher_name
+        self.student_layers = student_layers
+        self.student_hidden_size = student_hidden_size
+        self.temperature = temperature
+        self.teacher_batch_size = teacher_batch_size
+        self._teacher = None
+
+    @property
+    def device(self):
+        return torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+
+    @property
+    def teacher(self):
+        if self._teacher is None:
+            self._teacher = AutoModelForSequenceClassification.from_pretrained(self.teacher_name, token=config['HUGGING_FACE_TOKEN'])
+            self._teacher.to(self.device).eval()
+        return self._teacher
+
+    def train(self, output_dir, texts, labels=None, push=None, overwrite=False, resume=False):
+        texts = list(texts)
+        data = Dataset.from_dict({'text': texts})
+        return self.train_dataset(output_dir, data, scales_nlp.datasets.data_fingerprint(texts), push=push, overwrite=overwrite, resume=resume)
+
+    def load_data_file(self, data_path, text_col='text', label_col=None):
+        return super().load_data_file(data_path, text_col=text_col, label_col=None)
+
+    def collect_label_names(self, data, batch_size=10000):
+        id2label = self.teacher.config.id2label
+        return [id2label[i] for i in range(len(id2label))]
+
+    def load_model(self, model_name):
+        student_config = AutoConfig.from_pretrained(self.teacher_name, token=config['HUGGING_FACE_TOKEN'])
+        teacher_layers = student_config.num_hidden_layers
+        student_config.num_hidden_layers = self.student_layers
+        if self.student_hidden_size is not None and self.student_hidden_size != student_config.hidden_size:
+            student_config.hidden_size = self.student_hidden_size
+            student_config.num_attention_heads = max(1, self.student_hidden_size // 64)
+            if hasattr(student_config, 'intermediate_size'):
+                student_config.intermediate_size = 4 * self.student_hidden_size
+        student = AutoModelForSequenceClassification.from_config(student_config)
+
+        # copy the embeddings, head and evenly spaced layers of the teacher wherever the shapes match
+        layer_map = np.linspace(0, teacher_layers - 1, self.student_layers).round().astype(int) if self.student_layers > 1 else [teacher_layers - 1]
+        teacher_state = self.teacher.state_dict()
+        student_state = student.state_dict()
+        for name, value in student_state.items():
+            teacher_name = re.sub(r'(\.layers?\.)(\d+)(\.)', lambda m: m.group(1) + str(layer_map[int(m.group(2))]) + m.group(3), name)
+            if teacher_name in teacher_state and teacher_state[teacher_name].shape == value.shape:
+                student_state[name] = teacher_state[teacher_name].clone()
+        student.load_state_dict(student_state)
+        print(f'Student has {student.num_parameters():,} parameters, teacher has {self.teacher.num_parameters():,}')
+        return student
+
+    def create_dataset(self, data, fingerprint):
+        fingerprint = scales_nlp.datasets.data_fingerprint(
+            type(self).__name__, fingerprint, self.teacher_name, getattr(self.teacher.config, '_commit_hash', None),
+            scales_nlp.datasets.tokenizer_fingerprint(self.tokenizer), self.max_length,
+        )
+        return scales_nlp.datasets.cached_map(data, self.encode_batch, fingerprint, batch_size=self.teacher_batch_size * 8, desc='Computing teacher logits')
+
+    @torch.no_grad()
+    def encode_batch(self, batch):
+        inputs = self.tokenizer(batch['text'], max_length=self.max_length, truncation=True)
+        logits = []
+        for i in range(0, len(batch['text']), self.teacher_batch_size):
+            features = [{k: v[j] for k, v in inputs.items()} for j in range(i, min(i + self.teacher_batch_size, len(batch['text'])))]
+            teacher_inputs = self.tokenizer.pad(features, return_tensors='pt').to(self.device)
+            logits.append(self.teacher(**teacher_inputs).logits.float().cpu().numpy())
+        inputs['labels'] = np.concatenate(logits)
+        inputs['length'] = [len(input_ids) for input_ids in inputs['input_ids']]
+        return dict(inputs)
+
+    def compute_loss(self, model, inputs, return_outputs=False, **kwargs):
+        teacher_logits = inputs.pop("labels")
+        outputs = model(**inputs)
+        targets = torch.sigmoid(teacher_logits.float() / self.temperature)
+        loss_fct = torch.nn.BCEWithLogitsLoss()
+        loss = loss_fct(outputs.logits / self.temperature, targets) * self.temperature ** 2
+        return (loss, outputs) if return_outputs else loss
+
+    def compute_metrics(self, eval_pred):
+        logits, teacher_logits = eval_pred
+        thresholds = getattr(self.teacher.config, 'prediction_thresholds', None) or {}
+        thresholds = np.array([thresholds.get(label_name, 0.5) for label_name in self.label_names])
+        teacher_labels = (1 / (1 + np.exp(-teacher_logits)) > thresholds).astype(float)
+        scores = super().compute_metrics((logits, teacher_labels))
+        student_labels = 1 / (1 + np.exp(-logits)) > thresholds
+        scores['accuracy'] = (student_labels == teacher_labels).mean()
+        scores['exact_match'] = (student_labels == teacher_labels).all(axis=1).mean()
+        return scores
+
+    @torch.no_grad()
+    def throughput(self, model, dataset, num_examples=512):
+        """Examples per second of a model on the first examples of a dataset, in padded eval batches."""
+        model = model.to(self.device).eval()
+        dataset = dataset.select(range(min(num_examples, len(dataset))))
+        start = time.perf_counter()
+        for i in range(0, len(dataset), self.eval_batch_size):
+            features = [dataset[j] for j in range(i, min(i + self.eval_batch_size, len(dataset)))]
+            batch = self.collator(features)
+            batch.pop('labels')
+            model(**{k: v.to(self.device) for k, v in batch.items()})
+        return len(dataset) / (time.perf_counter() - start)
+
+    def train_dataset(self, output_dir, data, fingerprint, push=None, overwrite=False, resume=False):
+        results = super().train_dataset(output_dir, data, fingerprint, push=push, overwrite=overwrite, resume=resume)
+        student_speed = self.throughput(self.trainer.model, self.trainer.eval_dataset)
+        teacher_speed = self.throughput(self.teacher, self.trainer.eval_dataset)
+        results.update({
+            'student_examples_per_second': student_speed,
+            'teacher_examples_per_second': teacher_speed,
+            'speedup': student_speed / teacher_speed,
+        })
+        print(f'Student accuracy against the teacher: {results["eval_accuracy"]:.4f}, {student_speed:.1f} examples/s vs {teacher_speed:.1f} examples/s ({student_speed / teacher_speed:.1f}x)')
+        return results
+
+
 def training_routine(task, **kwargs):
     task2routine = {
         'classification': ClassificationRoutine,
         'multi-label-classification': MultiLabelClassificationRoutine,
         'token-classification': TokenClassificationRoutine,
         'ner': TokenClassificationRoutine,
+        'distillation': DistillationRoutine,
     }
     return task2routine[task](**kwargs)
+
+
+default_search_space = {
+    'learning_rate': [1e-5, 3e-5, 5e-5],
+    'train_batch_size': [8, 16],
+    'max_length': [128, 256],
+    'epochs': [2, 4],
+}
+
+
+def sample_trials(search_space, strategy='grid', num_trials=None, seed=0):
+    """Hyperparameters of each trial, every combination for a grid search (or a random subset of `num_trials`),
+    or `num_trials` random draws where the learning rate is sampled log-uniformly between its smallest and largest value."""
+    rng = np.random.default_rng(seed)
+    if strategy == 'grid':
+        trials = [dict(zip(search_space, values)) for values in itertools.product(*search_space.values())]
+        if num_trials is not None and num_trials < len(trials):
+            trials = [trials[i] for i in sorted(rng.choice(len(trials), num_trials, replace=False))]
+        return trials
+    elif strategy == 'random':
+        trials = []
+        for _ in range(num_trials or 10):
+            trial = {}
+            for name, values in search_space.items():
+                if name == 'learning_rate' and len(values) > 1:
+                    trial[name] = float(np.exp(rng.uniform(np.log(min(values)), np.log(max(values)))))
+                else:
+                    trial[name] = values[rng.integers(len(values))]
+            trials.append(trial)
+        return trials
+    raise ValueError(f'Unknown search strategy {strategy}, expected grid or random')
+
+
+class MedianPruningCallback(TrainerCallback):
+    """
+    Stops a sweep trial at an evaluation where its metric is worse than the median of the other trials at the same
+    step, once at least `min_trials` other trials have been evaluated at that step.  The evaluations of all trials are
+    shared through `history`, a dict of trial -> {step: metric} that is managed across the trial processes.
+    """
+    def __init__(self, trial, history, metric, greater_is_better, min_trials=3):
+        self.trial = trial
+        self.history = history
+        self.metric = metric if metric.startswith('eval_') else 'eval_' + metric
+        self.greater_is_better = greater_is_better
+        self.min_trials = min_trials
+        self.pruned = False
+
+    def on_evaluate(self, args, state, control, metrics=None, **kwargs):
+        trial_history = self.history.get(self.trial, {})
+        # the final evaluation after training repeats the last step with the best model
+        if metrics is None or self.metric not in metrics or state.global_step in trial_history:
+            return
+        value = metrics[self.metric]
+        trial_history[state.global_step] = value
+        self.history[self.trial] = trial_history
+        others = [
+            history[state.global_step] for trial, history in self.history.items()
+            if trial != self.trial and state.global_step in history
+        ]
+        if len(others) >= self.min_trials:
+            median = float(np.median(others))
+            if (value < median) if self.greater_is_better else (value > median):
+                self.pruned = True
+                control.should_training_stop = True
+
+
+def run_trial(trial):
+    """Train one sweep trial, run in a worker process limited to `threads` torch threads."""
+    torch.set_num_threads(trial['threads'])
+    callbacks = [TensorBoardCallback(), EarlyStoppingCallback(early_stopping_patience=trial['patience'])]
+    pruner = None
+    if trial['history'] is not None:
+        pruner = MedianPruningCallback(trial['trial'], trial['history'], trial['metric'], trial['greater_is_better'], min_trials=trial['prune_min_trials'])
+        callbacks.append(pruner)
+    routine = training_routine(
+        trial['task'], **trial['routine_kwargs'], **trial['params'], callbacks=callbacks,
+        metric_for_best_model=trial['metric'], greater_is_better=trial['greater_is_better'],
+    )
+    start = time.time()
+    results = routine.train_from_file(trial['output_dir'], trial['data_path'], text_col=trial['text_col'], label_col=trial['label_col'], overwrite=True)
+    results = {k: v for k, v in results.items() if isinstance(v, (int, float))}
+    return {
+        'trial': trial['trial'], **trial['params'], **results, 'pruned': pruner is not None and pruner.pruned,
+        'runtime': time.time() - start, 'output_dir': trial['output_dir'],
+    }
+
+
+def hyperparameter_sweep(
+    task, data_path, output_dir, search_space=None, strategy='grid', num_trials=None, workers=1,
+    threads_per_trial=None, patience=3, metric='eval_loss', greater_is_better=None, seed=0,
+    text_col='text', label_col='label', prune=True, prune_min_trials=3, **kwargs
+):
+    """Train a routine over a grid or random search of hyperparameters and return a leaderboard of the trials.
+
+    Trials run in parallel worker processes, each limited to `threads_per_trial` torch threads.  A trial stops early
+    when `metric` has not improved for `patience` evaluations, and with `prune` when its `metric` at an evaluation
+    is worse than the median of the other trials at the same step.  The best checkpoint of each trial is chosen by
+    `metric`.  The data is tokenized once per max_length before the
+    trials start, so every trial reads the same dataset cache.  The leaderboard is also saved to `leaderboard.csv`
+    in the output directory, next to the output directory of each trial.
+
+    :param task: Training task, see `training_routine`
+    :param data_path: Csv, parquet or json lines file with the training data
+    :param output_dir: Directory for the trial models and the leaderboard
+    :param search_space: Values to try for each routine argument, defaults to `default_search_space`
+    :param strategy: 'grid' or 'random'
+    :param num_trials: Number of random trials, or a random subset of the grid
+    :param workers: Number of trials to run at the same time
+    :param threads_per_trial: Torch threads per trial, defaults to splitting the cpu cores between the workers
+    :param patience: Number of evaluations without improvement before a trial is stopped
+    :param metric: Metric to select each trial's best checkpoint, prune and rank the trials by
+    :param greater_is_better: Whether a higher metric is better, defaults to False for losses and True otherwise
+    :param prune: Whether to stop trials that are worse than the median of the other trials
+    :param prune_min_trials: Number of other trials that must have reached an evaluation step before pruning at it
+    :param kwargs: Other arguments for the training routine
+    """
+    if greater_is_better is None:
+        greater_is_better = not metric.endswith('loss')
+    search_space = dict(default_search_space if search_space is None else search_space)
+    params = sample_trials(search_space, strategy=strategy, num_trials=num_trials, seed=seed)
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    for max_length in sorted(set(trial.get('max_length', kwargs.get('max_length', config['MAX_LENGTH'])) for trial in params)):
+        routine = training_routine(task, **{**kwargs, 'max_length': max_length})
+        data = routine.load_data_file(data_path, text_col=text_col, label_col=label_col)
+        routine.prepare_dataset(data, data._fingerprint)
+
+    threads = threads_per_trial or max(1, (os.cpu_count() or 1) // workers)
+    context = multiprocessing.get_context('spawn')
+    results = []
+    with context.Manager() as manager:
+        history = manager.dict() if prune else None
+        trials = [{
+            'trial': i, 'task': task, 'params': trial_params, 'routine_kwargs': kwargs, 'threads': threads, 'patience': patience,
+            'data_path': str(data_path), 'output_dir': str(output_dir / f'trial-{i}'), 'text_col': text_col, 'label_col': label_col,
+            'metric': metric, 'greater_is_better': greater_is_better, 'history': history, 'prune_min_trials': prune_min_trials,
+        } for i, trial_params in enumerate(params)]
+
+        with ProcessPoolExecutor(workers, mp_context=context) as executor:
+            futures = {executor.submit(run_trial, trial): trial for trial in trials}
+            for future in as_completed(futures):
+                trial = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    result = {'trial': trial['trial'], **trial['params'], 'error': repr(e)}
+                results.append(result)
+                print(f"Trial {len(results)}/{len(trials)}:", {k: v for k, v in result.items() if k != 'output_dir'})
+
+    leaderboard = pd.DataFrame(results)
+    if metric in leaderboard.columns:
+        leaderboard = leaderboard.sort_values(metric, ascending=not greater_is_better, na_position='last')
+    leaderboard.to_csv(output_dir / 'leaderboard.csv', index=False)
+    return leaderboard
@@ -0,0 +1,154 @@
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from pathlib import Path
+from typing import Union, List, Tuple, Dict
+import pandas as pd
+from toolz import partition_all
+from tqdm import tqdm
+import scales_nlp
+
+
+ENTRY_COLUMNS = ['ucid', 'row_number', 'entry_number', 'date_filed', 'labels', 'opening', 'dispositive_event']
+CASE_COLUMNS = [
+    'ucid', 'court', 'docket_number', 'case_name', 'nos', 'entries', 'plaintiffs', 'defendants',
+    'opening', 'opening_date', 'dispositive_events', 'dispositive_date',
+]
+
+
+def table_schemas():
+    import pyarrow as pa
+    entry_schema = pa.schema([
+        ('ucid', pa.string()),
+        ('row_number', pa.int64()),
+        ('entry_number', pa.string()),
+        ('date_filed', pa.date32()),
+        ('labels', pa.list_(pa.string())),
+        ('opening', pa.string()),
+        ('dispositive_event', pa.string()),
+    ])
+    case_schema = pa.schema([
+        ('ucid', pa.string()),
+        ('court', pa.string()),
+        ('docket_number', pa.string()),
+        ('case_name', pa.string()),
+        ('nos', pa.int64()),
+        ('entries', pa.int64()),
+        ('plaintiffs', pa.int64()),
+        ('defendants', pa.int64()),
+        ('opening', pa.string()),
+        ('opening_date', pa.date32()),
+        ('dispositive_events', pa.list_(pa.string())),
+        ('dispositive_date', pa.date32()),
+    ])
+    return entry_schema, case_schema
+
+
+def to_date(date):
+    return None if date is None or pd.isna(date) else date.date()
+
+
+def docket_rows(docket: 'scales_nlp.Docket') -> Tuple[List[Dict], Dict]:
+    """Flatten a processed docket into entry-level rows and a case-level row."""
+    events = {}
+    for event in docket.events:
+        if event.entry is not None:
+            events.setdefault(event.entry.row_number, {})[event.event_type] = event.name
+
+    entry_rows = []
+    for entry in docket:
+        entry_events = events.get(entry.row_number, {})
+        entry_rows.append({
+            'ucid': docket.ucid,
+            'row_number': entry.row_number,
+            'entry_number': None if entry.entry_number is None else str(entry.entry_number),
+            'date_filed': to_date(entry.date_filed),
+            'labels': entry.labels,
+            'opening': entry_events.get('opening'),
+            'dispositive_event': entry_events.get('dispositive'),
+        })
+
+    opening = docket.opening
+    dispositive_events = docket.dispositive_events
+    case_row = {
+        'ucid': docket.ucid,
+        'court': docket.ucid.split(';;')[0],
+        'docket_number': docket.docket_number,
+        'case_name': docket.case_name,
+        'nos': docket.nos,
+        'entries': len(docket),
+        'plaintiffs': len(docket.plaintiff_names),
+        'defendants': len(docket.defendant_names),
+        'opening': opening.name,
+        'opening_date': None if opening.entry is None else to_date(opening.entry.date_filed),
+        'dispositive_events': [event.name for event in dispositive_events],
+        'dispositive_date': None if len(dispositive_events) == 0 or dispositive_events[0].entry is None else to_date(dispositive_events[0].entry.date_filed),
+    }
+    return entry_rows, case_row
+
+
+def docket_table_rows(ucids: List[str], skip_monkey_patch: bool=False, cache: bool=False) -> Tuple[List[Dict], List[Dict]]:
+    """Worker for `docket_table`, builds the rows for a chunk of ucids."""
+    entry_rows, case_rows = [], []
+    for ucid in ucids:
+        try:
+            docket = scales_nlp.Docket.from_ucid(ucid, skip_monkey_patch=skip_monkey_patch, cache=cache)
+        except Exception as e:
+            print('failed to load {}: {}'.format(ucid, e))
+            continue
+        docket_entry_rows, case_row = docket_rows(docket)
+        entry_rows += docket_entry_rows
+        case_rows.append(case_row)
+    return entry_rows, case_rows
+
+
+def docket_table(
+    ucids: List[str]=None, court: str=None, year: Union[str, int]=None, output_dir: Union[str, Path]=None,
+    workers: int=None, chunk_size: int=500, skip_monkey_patch: bool=False, cache: bool=False,
+) -> Union[Tuple[pd.DataFrame, pd.DataFrame], Tuple[Path, Path]]:
+    """Build entry-level and case-level tables of labels and events for many dockets.
+
+    :param ucids: Cases to include, if None then all cases in the PACER_DIR matching `court` and `year`
+    :param court: Court abbreviation to filter on when `ucids` is None
+    :param year: Filing year (as it appears in the ucid) to filter on when `ucids` is None
+    :param output_dir: If provided, write `entries.parquet` and `cases.parquet` here (one row group per chunk) instead of returning DataFrames
+    :param workers: Number of worker processes, defaults to the number of CPUs
+    :param chunk_size: Number of cases processed per task
+    :param cache: Whether to load (and save) processed dockets with the docket cache
+    :return: The entry and case tables, or the paths to the written parquet files
+    """
+    if ucids is None:
+        ucids = scales_nlp.list_ucids(court=court, year=year)
+    chunks = [list(chunk) for chunk in partition_all(chunk_size, ucids)]
+
+    writers = None
+    if output_dir is not None:
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError('pyarrow is required to write docket tables, install it with `pip install pyarrow`')
+        output_dir = Path(output_dir)
+        output_dir.mkdir(parents=True, exist_ok=True)
+        entry_schema, case_schema = table_schemas()
+        entries_path, cases_path = output_dir / 'entries.parquet', output_dir / 'cases.parquet'
+        writers = pq.ParquetWriter(entries_path, entry_schema), pq.ParquetWriter(cases_path, case_schema)
+
+    entry_rows, case_rows = [], []
+    try:
+        with ProcessPoolExecutor(workers) as executor:
+            results = executor.map(docket_table_rows, chunks, repeat(skip_monkey_patch), repeat(cache))
+            for chunk_entry_rows, chunk_case_rows in tqdm(results, total=len(chunks)):
+                if writers is None:
+                    entry_rows += chunk_entry_rows
+                    case_rows += chunk_case_rows
+                else:
+                    writers[0].write_table(pa.Table.from_pylist(chunk_entry_rows, schema=entry_schema))
+                    writers[1].write_table(pa.Table.from_pylist(chunk_case_rows, schema=case_schema))
+    finally:
+        if writers is not None:
+            for writer in writers:
+                writer.close()
+
+    if writers is not None:
+        return entries_path, cases_path
+    return pd.DataFrame(entry_rows, columns=ENTRY_COLUMNS), pd.DataFrame(case_rows, columns=CASE_COLUMNS)
@@ -3,14 +3,26 @@ from pathlib import Path
 from typing import Union, List, Tuple, Dict
 import os
 import pandas as pd
-import requests
+import shlex
+import subprocess
 import tempfile
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from tqdm import tqdm
 from toolz import partition_all
 import scales_nlp
 from scales_nlp import config
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import simdjson
+except ImportError:
+    simdjson = None
+
 
 PACKAGE_DIR = Path(__file__).parent
 PACKAGE_DATA_DIR = PACKAGE_DIR / 'data'
@@ -18,28 +30,65 @@ PACKAGE_DATA_DIR = PACKAGE_DIR / 'data'
 LABEL_DATA_DIR = config['LABEL_DATA_DIR'] if config['LABEL_DATA_DIR'] is not None else config['PACER_DIR']
 JUDGE_DATA_DIR = config['JUDGE_DATA_DIR'] if config['JUDGE_DATA_DIR'] is not None else config['PACER_DIR']
 
-COURTS = pd.read_csv(PACKAGE_DATA_DIR / 'courts.csv')
-STATES = COURTS['state'].dropna().unique()
-DIVISIONS = COURTS['cardinal'].dropna().unique()
+_court_data = {}
+
+
+def court_data() -> Dict:
+    """The COURTS table and derived STATES and DIVISIONS, read from the package data on first use."""
+    if len(_court_data) == 0:
+        courts = pd.read_csv(PACKAGE_DATA_DIR / 'courts.csv')
+        _court_data['COURTS'] = courts
+        _court_data['STATES'] = courts['state'].dropna().unique()
+        _court_data['DIVISIONS'] = courts['cardinal'].dropna().unique()
+    return _court_data
+
+
+def __getattr__(name):
+    if name in ['COURTS', 'STATES', 'DIVISIONS']:
+        return court_data()[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 def courts() -> pd.DataFrame:
-    return COURTS.copy()
+    return court_data()['COURTS'].copy()
 
 
 def states() -> List[str]:
-    return STATES
+    return court_data()['STATES']
 
 
 def divisions() -> List[str]:
-    return DIVISIONS
+    return court_data()['DIVISIONS']
 
 
 def load_json(path: Union[str, Path]) -> Dict:
+    """Load a json file, using orjson if it is installed."""
+    if orjson is not None:
+        with open(str(path), 'rb') as f:
+            data = f.read()
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            # orjson is strict about non-standard values such as NaN
+            return json.loads(data)
     with open(str(path), 'r') as f:
         return json.loads(f.read())
 
 
+def save_json(path: Union[str, Path], data: Union[Dict, List]):
+    """Save a json file, using orjson if it is installed."""
+    if orjson is not None:
+        try:
+            data = orjson.dumps(data, option=orjson.OPT_SERIALIZE_NUMPY)
+        except TypeError:
+            data = json.dumps(data).encode()
+        with open(str(path), 'wb') as f:
+            f.write(data)
+    else:
+        with open(str(path), 'w') as f:
+            json.dump(data, f)
+
+
 def get_ucid_components(ucid: str) -> Tuple[str, str, str]:
     court = ucid.split(';;')[0]
     docket_number = ucid.split(';;')[1]
@@ -48,6 +97,10 @@ def get_ucid_components(ucid: str) -> Tuple[str, str, str]:
     return court, docket_number, office_number, year
 
 
+def list_ucids(court: str=None, year: Union[str, int]=None, office: str=None) -> List[str]:
+    return scales_nlp.pacer_index().ucids(court=court, year=year, office=office)
+
+
 def case_path(ucid: str, html: bool=False) -> Path:
     file_type = 'html' if html else 'json'
     court, docket_number, _, year = get_ucid_components(ucid)
@@ -63,20 +116,50 @@ def load_case(ucid: str, html: bool=False) -> Dict:
         return load_json(path)
 
 
-def load_case_classifier_labels(ucid: str) -> List:
+def case_labels_path(ucid: str) -> Path:
     court, docket_number, _, year = get_ucid_components(ucid)
     filename = docket_number.replace(':', '-') + '.json'
-    path = LABEL_DATA_DIR / court / 'labels' / year / filename
+    return LABEL_DATA_DIR / court / 'labels' / year / filename
+
+
+def case_judge_labels_path(ucid: str) -> Path:
+    court, _, _, year = get_ucid_components(ucid)
+    filename = ucid.replace(';;', '-').replace(':', '-') + '.jsonl'
+    return JUDGE_DATA_DIR / court / year / filename
+
+
+def load_case_header(ucid: str) -> Dict:
+    """Load a case json without its docket entries.  If pysimdjson is installed the entries are never materialized."""
+    path = case_path(ucid)
+    if simdjson is not None:
+        with open(str(path), 'rb') as f:
+            case = simdjson.Parser().parse(f.read())
+        header = {}
+        for key in case.keys():
+            if key != 'docket':
+                value = case[key]
+                if isinstance(value, simdjson.Object):
+                    value = value.as_dict()
+                elif isinstance(value, simdjson.Array):
+                    value = value.as_list()
+                header[key] = value
+        return header
+    case = load_json(path)
+    del case['docket']
+    return case
+
+
+def load_case_classifier_labels(ucid: str) -> List:
+    path = case_labels_path(ucid)
     if path.exists():
         return load_json(path)
     else:
         print('labels not computed for {}'.format(ucid))
         return []
 
+
 def load_case_judge_labels(ucid: str) -> pd.DataFrame:
-    court, _, _, year = get_ucid_components(ucid)
-    filename = ucid.replace(';;', '-').replace(':', '-') + '.jsonl'
-    path = JUDGE_DATA_DIR / court / year / filename
+    path = case_judge_labels_path(ucid)
     if path.exists():
         return pd.read_json(path, lines=True)
     else:
@@ -84,8 +167,90 @@ def load_case_judge_labels(ucid: str) -> pd.DataFrame:
         return pd.DataFrame()
 
 
+def judge_spans_from_df(judge_df: pd.DataFrame) -> Dict[int, List[Tuple[int, int]]]:
+    spans = {}
+    if len(judge_df):
+        for index, start, end in zip(judge_df['docket_index'], judge_df['Entity_Span_Start'], judge_df['Entity_Span_End']):
+            spans.setdefault(int(index), []).append((int(start), int(end)))
+    return spans
+
+
+def read_judge_spans(path: Union[str, Path]) -> Dict[int, List[Tuple[int, int]]]:
+    spans = {}
+    with open(str(path), 'rb') as f:
+        for line in f:
+            if line.strip():
+                row = orjson.loads(line) if orjson is not None else json.loads(line)
+                spans.setdefault(int(row['docket_index']), []).append((int(row['Entity_Span_Start']), int(row['Entity_Span_End'])))
+    return spans
+
+
+def judge_store_path(court: str, year: str) -> Path:
+    return JUDGE_DATA_DIR / court / f'{year}.parquet'
+
+
+def load_case_judge_spans(ucid: str) -> Dict[int, List[Tuple[int, int]]]:
+    """Load judge entity spans for a case as a dict of docket_index -> [(start, end), ...], without pandas."""
+    path = case_judge_labels_path(ucid)
+    if path.exists():
+        return read_judge_spans(path)
+    court, _, _, year = get_ucid_components(ucid)
+    if judge_store_path(court, year).exists():
+        return load_judge_spans([ucid])[ucid]
+    print('labels not computed for {}'.format(ucid))
+    return {}
+
+
+def load_judge_spans(ucids: List[str]) -> Dict[str, Dict[int, List[Tuple[int, int]]]]:
+    """Batch version of `load_case_judge_spans`, reading each court / year judge store once if it exists."""
+    groups = {}
+    for ucid in ucids:
+        court, _, _, year = get_ucid_components(ucid)
+        groups.setdefault((court, year), []).append(ucid)
+
+    spans = {}
+    for (court, year), group_ucids in groups.items():
+        store_path = judge_store_path(court, year)
+        if store_path.exists():
+            store = pd.read_parquet(store_path, filters=[('ucid', 'in', group_ucids)])
+            for ucid in group_ucids:
+                spans[ucid] = {}
+            for ucid, index, start, end in zip(store['ucid'], store['docket_index'], store['start'], store['end']):
+                spans[ucid].setdefault(int(index), []).append((int(start), int(end)))
+        else:
+            for ucid in group_ucids:
+                path = case_judge_labels_path(ucid)
+                spans[ucid] = read_judge_spans(path) if path.exists() else {}
+    return spans
+
+
+def consolidate_judge_labels(court: str, year: str=None) -> List[Path]:
+    """
+    Write the per-case judge jsonl files for a court into one columnar store per year
+    (`JUDGE_DATA_DIR/{court}/{year}.parquet`), which `load_judge_spans` reads in a single pass.
+    Requires pyarrow.
+    """
+    years = [year] if year is not None else sorted(x.name for x in (JUDGE_DATA_DIR / court).iterdir() if x.is_dir() and x.name.isdigit())
+    store_paths = []
+    for year in years:
+        rows = {'ucid': [], 'docket_index': [], 'start': [], 'end': []}
+        for path in sorted((JUDGE_DATA_DIR / court / year).glob('*.jsonl')):
+            ucid = court + ';;' + path.stem[len(court) + 1:].replace('-', ':', 1)
+            for index, spans in read_judge_spans(path).items():
+                for start, end in spans:
+                    rows['ucid'].append(ucid)
+                    rows['docket_index'].append(index)
+                    rows['start'].append(start)
+                    rows['end'].append(end)
+        store_path = judge_store_path(court, year)
+        pd.DataFrame(rows).to_parquet(store_path, index=False)
+        store_paths.append(store_path)
+    return store_paths
+
+
 def load_court(court: str) -> Dict:
-    courts = COURTS[COURTS['abbreviation'] == court]
+    courts = court_data()['COURTS']
+    courts = courts[courts['abbreviation'] == court]
     if len(courts) == 0:
         print(f'Court {court} not found')
         return None
@@ -104,40 +269,122 @@ def convert_default_binary_outputs(
     return converted_predictions
 
 
-def crawl_pacer(ucid: str):
-    print('WARNING: this command can spend up to 3$ per case (depending on the number of pages)')
-    court, docket_number, office_number, year = get_ucid_components(ucid)
+def run_scraper(court: str, ucids: List[str], workers: int=1, scraper_cmd: str='pacer-tools scraper') -> int:
+    """Run the scraper once for a batch of cases from the same court and return its exit status."""
     with tempfile.TemporaryDirectory() as tempdir:
         tempdir = Path(tempdir)
         auth = {"user": config['PACER_USERNAME'], "pass": config['PACER_PASSWORD']}
         auth_path = tempdir / 'auth.json'
         with open(auth_path, 'w') as f:
             f.write(json.dumps(auth))
-        query = pd.DataFrame({'ucid': [ucid]})
+        query = pd.DataFrame({'ucid': ucids})
         query_path = tempdir / 'query.csv'
         query.to_csv(query_path, index=False)
-        (config['PACER_DIR'] / court / 'html' / year).mkdir(parents=True, exist_ok=True)
-        (config['PACER_DIR'] / court / 'json' / year).mkdir(parents=True, exist_ok=True)
-        cmd = f"pacer-tools scraper --headless --override-time --docket-input {query_path} -c {court} -nw 1 -cl 1 -m docket -a {auth_path} {config['PACER_DIR'] / court}"
-        os.system(cmd)
+        for year in set(get_ucid_components(ucid)[3] for ucid in ucids):
+            (config['PACER_DIR'] / court / 'html' / year).mkdir(parents=True, exist_ok=True)
+            (config['PACER_DIR'] / court / 'json' / year).mkdir(parents=True, exist_ok=True)
+        cmd = shlex.split(scraper_cmd) + [
+            '--headless', '--override-time', '--docket-input', str(query_path), '-c', court,
+            '-nw', str(workers), '-cl', '1', '-m', 'docket', '-a', str(auth_path), str(config['PACER_DIR'] / court),
+        ]
+        return subprocess.run(cmd).returncode
+
 
+def crawl_pacer(ucid: str):
+    print('WARNING: this command can spend up to 3$ per case (depending on the number of pages)')
+    court, docket_number, office_number, year = get_ucid_components(ucid)
+    run_scraper(court, [ucid])
 
-def parse_pacer_dir(court: str=None):
-    if court is not None:
-        paths = [config['PACER_DIR'] / court / 'html']
+
+def unparsed_ucids(court: str=None) -> Dict[str, List[str]]:
+    """Cases per court whose html is newer than their json, or that have no json yet, by the mtimes in the PacerIndex.
+
+    Files overwritten in place by other tools keep their old mtime in the index until a full refresh of the index.
+    """
+    index = scales_nlp.pacer_index()
+    html = index.query(court=court, kind='html')
+    json_files = index.query(court=court, kind='json')[['ucid', 'mtime']]
+    files = html.merge(json_files, on='ucid', how='left', suffixes=('', '_json'))
+    unparsed = files[files['mtime_json'].isna() | (files['mtime_json'] < files['mtime'])]
+    ucids = {x: [] for x in html['court'].unique()}
+    for html_court, ucid in zip(unparsed['court'], unparsed['ucid']):
+        ucids[html_court].append(ucid)
+    return ucids
+
+
+def run_parser(court: str, ucids: List[str]=None) -> Dict:
+    """Run the pacer-tools parser over a court, re-parsing only `ucids` if given, or else every html file in the court."""
+    start = time.time()
+    cmd = ['pacer-tools', 'parser', str(config['PACER_DIR'] / court / 'html')]
+    with tempfile.TemporaryDirectory() as tempdir:
+        if ucids is None:
+            cmd.append('--force-rerun')
+        else:
+            ucids_path = Path(tempdir) / 'ucids.csv'
+            pd.DataFrame({'ucid': ucids}).to_csv(ucids_path, index=False)
+            cmd += ['--force-ucids', str(ucids_path)]
+        result = subprocess.run(cmd, capture_output=True, text=True)
+    return {'court': court, 'returncode': result.returncode, 'seconds': time.time() - start, 'stderr': result.stderr}
+
+
+def parse_pacer_dir(court: str=None, workers: int=None, force: bool=False, full_index: bool=False) -> List[Dict]:
+    """Run the pacer-tools parser over each court in the PACER_DIR, running up to `workers` courts at a time.
+
+    Only the html files whose json is missing or older than the html are parsed, using the mtimes in the
+    PacerIndex, and courts without any are skipped.
+
+    :param court: Only parse this court
+    :param workers: Number of courts to parse concurrently, defaults to the number of CPUs
+    :param force: Re-parse every html file, even if its json is up to date
+    :param full_index: Fully refresh the index first, to pick up html files that were overwritten in place
+    :return: The exit status, runtime and number of files submitted to the parser for each court
+    """
+    index = scales_nlp.pacer_index()
+    if full_index:
+        index.refresh(court, full=True)
+    if force:
+        html = index.query(court=court, kind='html')
+        ucids = {x: None for x in html['court'].unique()}
+        files = html['court'].value_counts().to_dict()
     else:
-        paths = config['PACER_DIR'].glob('*/html')
-        
-    for path in paths:
-        cmd = f"pacer-tools parser {path}"
-        os.system(cmd)
-        time.sleep(0.5)
+        ucids = unparsed_ucids(court)
+        files = {x: len(ucids[x]) for x in ucids}
+    if court is not None and court not in ucids:
+        ucids[court], files[court] = [], 0
+    courts = [x for x in sorted(ucids) if force or files[x] > 0]
+    for skipped_court in sorted(set(ucids) - set(courts)):
+        print(f'{skipped_court}: up to date, skipping')
+
+    results = []
+    with ThreadPoolExecutor(workers or os.cpu_count()) as executor:
+        futures = [executor.submit(run_parser, x, ucids[x]) for x in courts]
+        for future in as_completed(futures):
+            result = future.result()
+            result['files'] = files.get(result['court'], 0)
+            results.append(result)
+            if result['returncode'] == 0:
+                rate = result['files'] / result['seconds'] if result['seconds'] > 0 else 0
+                print(f"{result['court']}: parsed {result['files']} files in {result['seconds']:.1f}s ({rate:.1f} files/s)")
+            else:
+                print(f"{result['court']}: parser failed with exit status {result['returncode']}")
+                print(result['stderr'][-2000:])
+            if ucids[result['court']] is None:
+                index.refresh(result['court'], full=True)
+            else:
+                # rewritten json files keep their directory mtime, so an incremental refresh would miss them
+                index.update_files('json', [case_path(ucid) for ucid in ucids[result['court']]])
+    return results
 
 
 def update_classifier_predictions(batch_size=8, reset=False):
-    paths = list(config['PACER_DIR'].glob('*/json/*/*.json'))
+    index = scales_nlp.pacer_index()
+    paths = [Path(path) for path in index.query(kind='json')['path']]
     if not reset:
-        paths = [path for path in paths if not Path(str(path).replace('/json/', '/labels/')).exists()]
+        if LABEL_DATA_DIR == config['PACER_DIR']:
+            labeled = set(index.query(kind='labels')['path'])
+            paths = [path for path in paths if str(path).replace('/json/', '/labels/') not in labeled]
+        else:
+            paths = [path for path in paths if not Path(str(path).replace('/json/', '/labels/')).exists()]
     if len(paths) > 0:
         batches = list(partition_all(100, paths))
         nlp = scales_nlp.pipeline('multi-label-classification', model_name='scales-okn/docket-classification')
@@ -158,8 +405,7 @@ def update_classifier_predictions(batch_size=8, reset=False):
                 labels['spans'] = labels['labels'].apply(lambda x: [])
                 labels = labels.to_dict(orient='records')
                 path.parent.mkdir(parents=True, exist_ok=True)
-                with open(path, 'w') as f:
-                    json.dump(labels, f)
+                save_json(path, labels)
 
 
 
@@ -0,0 +1,89 @@
+"""
+Checks for the case json loaders in `scales_nlp.utils` and the lazy `Docket.from_ucid`.
+
+`load_case_header` is compared with the full case json, with and without pysimdjson, and a lazy docket is
+checked to only parse the docket entries when they are first accessed.  Run `python tests/test_case_json.py`
+to time the loaders on a synthetic case of about 3 MB.
+"""
+import json
+import shutil
+import time
+import pytest
+import scales_nlp
+from scales_nlp import config
+from test_docket_events import example_cases
+
+
+COURT = 'zztestd'
+UCID = f'{COURT};;1:16-cv-00001'
+
+
+def write_case(ucid, repeat=1):
+    case_json, label_json = example_cases()[0]
+    case_json = dict(case_json, ucid=ucid, docket=case_json['docket'] * repeat)
+    label_json = [dict(x, row_number=x['row_number'] + i * len(label_json)) for i in range(repeat) for x in label_json]
+    for path, data in [(scales_nlp.case_path(ucid), case_json), (scales_nlp.case_labels_path(ucid), label_json)]:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(data))
+    return case_json, label_json
+
+
+@pytest.fixture
+def case():
+    yield write_case(UCID)
+    shutil.rmtree(config['PACER_DIR'] / COURT)
+
+
+@pytest.mark.parametrize('use_simdjson', [True, False])
+def test_header_matches_case(case, use_simdjson, monkeypatch):
+    if use_simdjson and scales_nlp.utils.simdjson is None:
+        pytest.skip('pysimdjson is not installed')
+    if not use_simdjson:
+        monkeypatch.setattr(scales_nlp.utils, 'simdjson', None)
+    expected = {k: v for k, v in case[0].items() if k != 'docket'}
+    assert scales_nlp.load_case_header(UCID) == expected
+
+
+def test_load_json_non_standard_values(tmp_path):
+    path = tmp_path / 'case.json'
+    path.write_text('{"amount": NaN, "name": "x"}')
+    data = scales_nlp.load_json(path)
+    assert data['name'] == 'x' and data['amount'] != data['amount']
+
+
+def test_lazy_docket_parses_entries_on_first_access(case, monkeypatch):
+    loaded = []
+    load_case = scales_nlp.load_case
+    monkeypatch.setattr(scales_nlp, 'load_case', lambda ucid, html=False: loaded.append(ucid) or load_case(ucid, html))
+
+    docket = scales_nlp.Docket.from_ucid(UCID, lazy=True)
+    assert docket.case_name == 'Plaintiff v. Defendant'
+    assert docket.plaintiff_names == ['Jane Plaintiff']
+    assert loaded == [] and not docket.entries_loaded
+
+    assert len(docket) == len(case[0]['docket'])
+    assert loaded == [UCID]
+    eager = scales_nlp.Docket.from_ucid(UCID)
+    assert [(x.name, x.event_type, x.entry and x.entry.row_number) for x in docket.events] == \
+        [(x.name, x.event_type, x.entry and x.entry.row_number) for x in eager.events]
+    assert [entry.labels for entry in docket] == [entry.labels for entry in eager]
+
+
+def time_call(function, repeat=20):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+if __name__ == '__main__':
+    try:
+        write_case(UCID, repeat=450)
+        path = scales_nlp.case_path(UCID)
+        print(f'case json: {path.stat().st_size / 1e6:.1f} MB')
+        print(f'json.loads: {time_call(lambda: json.loads(path.read_text())):.1f} ms')
+        print(f'load_case (orjson: {scales_nlp.utils.orjson is not None}): {time_call(lambda: scales_nlp.load_case(UCID)):.1f} ms')
+        print(f'load_case_header (pysimdjson: {scales_nlp.utils.simdjson is not None}): {time_call(lambda: scales_nlp.load_case_header(UCID)):.1f} ms')
+        print(f'Docket.from_ucid(lazy=True).case_name: {time_call(lambda: scales_nlp.Docket.from_ucid(UCID, lazy=True).case_name):.1f} ms')
+    finally:
+        shutil.rmtree(config['PACER_DIR'] / COURT)
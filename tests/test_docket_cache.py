@@ -0,0 +1,45 @@
+"""
+Checks for the size accounting of `scales_nlp.cache.DocketCache`.
+"""
+import json
+import pandas as pd
+import pytest
+import scales_nlp
+from scales_nlp.cache import DocketCache
+from test_docket_events import example_cases
+
+
+def make_docket(repeat=1):
+    case_json, _ = example_cases()[0]
+    case_json = dict(case_json, docket=case_json['docket'] * repeat)
+    return scales_nlp.Docket.from_json(json.loads(json.dumps(case_json)), label_json=[], judge_df=pd.DataFrame())
+
+
+def cache_files_size(cache):
+    return sum(path.stat().st_size for path in cache.cache_dir.glob('*/*.pkl'))
+
+
+def test_overwrite_keeps_size(tmp_path):
+    cache = DocketCache(tmp_path)
+    ucid = make_docket().ucid
+    cache.set(ucid, make_docket())
+    cache.set('ilnd;;1:16-cv-99999', make_docket())
+    for repeat in [3, 1, 2]:
+        cache.set(ucid, make_docket(repeat))
+        assert cache.size == cache_files_size(cache)
+
+
+def test_corrupt_entry_is_removed_from_size(tmp_path):
+    ucid = make_docket().ucid
+    DocketCache(tmp_path).set(ucid, make_docket())
+    DocketCache(tmp_path).path(ucid).write_bytes(b'not a pickle')
+    cache = DocketCache(tmp_path)
+    cache.set('ilnd;;1:16-cv-99999', make_docket())
+    assert cache.get(ucid) is None
+    assert not cache.path(ucid).exists()
+    assert cache.size == cache_files_size(cache)
+
+
+def test_cache_and_lazy_are_exclusive():
+    with pytest.raises(ValueError):
+        scales_nlp.Docket.from_ucid('ilnd;;1:16-cv-99999', cache=True, lazy=True)
@@ -0,0 +1,51 @@
+"""
+Equivalence check for the cached entry date parser `scales_nlp.docket.parse_date`.
+
+The entry dates in data/docket_examples.csv, and malformed and non-PACER dates, are parsed with `parse_date`
+and compared with `pd.to_datetime(date, errors='coerce')`, which it replaced in `DocketEntry.__init__`.
+"""
+import re
+from pathlib import Path
+import pandas as pd
+import pytest
+import scales_nlp
+from scales_nlp.docket import date_cache, parse_date
+
+
+EXAMPLES_PATH = Path(scales_nlp.__file__).parent / 'data' / 'docket_examples.csv'
+EDGE_CASES = [
+    None, '', ' ', 'garbage', '1/2/2020', '01/02/2020', '12/31/1999', '02/29/2020', '02/29/2019', '02/30/2020',
+    '13/01/2020', '00/10/2020', '10/00/2020', '2020-01-05', '2020/01/05', 'January 5, 2020', '01/05/20',
+    '01/05/2020 ', ' 01/05/2020', '01/05/2020x', '001/05/2020',
+]
+
+
+def example_dates():
+    texts = pd.read_csv(EXAMPLES_PATH)['docket_text']
+    return sorted({match for text in texts for match in re.findall(r'\(Entered: ([^)]*)\)', text)})
+
+
+def assert_same_date(parsed, expected):
+    if pd.isna(expected):
+        assert pd.isna(parsed)
+    else:
+        assert parsed == expected
+
+
+def test_example_dates_match_pandas():
+    dates = example_dates()
+    assert len(dates) > 0
+    for date in dates:
+        assert_same_date(parse_date(date), pd.to_datetime(date, errors='coerce'))
+
+
+@pytest.mark.parametrize('date', EDGE_CASES)
+def test_edge_cases_match_pandas(date):
+    assert_same_date(parse_date(date), pd.to_datetime(date, errors='coerce'))
+
+
+def test_dates_are_cached():
+    date_cache.clear()
+    parsed = parse_date('03/04/2021')
+    assert date_cache == {'03/04/2021': parsed}
+    assert parse_date('03/04/2021') is parsed
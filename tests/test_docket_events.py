@@ -0,0 +1,150 @@
+"""
+Regression check for `Docket.process_events` on the examples in data/docket_examples.csv.
+
+The examples are grouped into synthetic dockets, followed by a few hand written dockets with classifier spans
+and edges for the transfer, inbound relabel and related entry rules.  The events and final entry labels of each
+docket are compared with tests/data/docket_examples_events.json, which was generated with the implementation
+from before the event rule tables.  Regenerate it with `python tests/test_docket_events.py` only when the event
+output is meant to change.
+"""
+import json
+import re
+from pathlib import Path
+import pandas as pd
+import pytest
+import scales_nlp
+
+
+EXPECTED_PATH = Path(__file__).parent / 'data' / 'docket_examples_events.json'
+EXAMPLES_PATH = Path(scales_nlp.__file__).parent / 'data' / 'docket_examples.csv'
+DOCKET_SIZE = 25
+
+# (docket text, labels, spans as (entity, text), edges as (span text, related row number)) for each entry
+SPAN_DOCKETS = [
+    [
+        ('TRANSFER IN from the Southern District of New York', ['transfer'], [('TRANSFER_FROM', 'Southern District of New York')], []),
+        ('ANSWER by Acme Corp', ['answer'], [('ENTERED_BY', 'Acme Corp')], []),
+        ('MOTION to dismiss for failure to state a claim by Acme Corp', ['motion', 'dismissing motion', 'motion to dismiss'], [('ENTERED_BY', 'Acme Corp')], []),
+        ('MINUTE entry, status hearing held', ['minute entry'], [], []),
+        ('ORDER granting 3 motion to dismiss under rule 12(b)(6)', ['order', 'granting motion to dismiss'], [('GRANT', '3')], []),
+        ('ENTERED JUDGMENT', ['judgment'], [], []),
+    ],
+    [
+        ('CASE transferred in, transfer to the District of Colorado', ['transfer'], [('TRANSFER_TO', 'District of Colorado')], []),
+        ('MOTION to transfer venue by Acme Corp', ['motion'], [('ENTERED_BY', 'Acme Corp')], []),
+        ('RESPONSE by Jane Plaintiff', ['response'], [('ENTERED_BY', 'Jane Plaintiff')], []),
+        ('MINUTE entry, motion hearing held', ['minute entry'], [], []),
+        ('ORDER transferring case to a court in Illinois', ['order', 'transfer'], [('TRANSFER_TO', 'Illinois')], []),
+        ('CASE transferred to the Northern District of Illinois', ['transfer'], [('TRANSFER_TO', 'Northern District of Illinois')], []),
+        ('CASE transferred to the District of Colorado', ['transfer'], [('TRANSFER_TO', 'District of Colorado')], []),
+    ],
+    [
+        ('COMPLAINT filed by Jane Plaintiff', ['complaint'], [('ENTERED_BY', 'Jane Plaintiff')], []),
+        ('MOTION to dismiss by Jane Plaintiff', ['motion', 'dismissing motion', 'motion to dismiss'], [('ENTERED_BY', 'Jane Plaintiff')], []),
+        ('ORDER granting voluntary dismissal', ['order', 'granting motion to dismiss', 'voluntary dismissal resolution'], [('GRANT', 'granting')], [('granting', 1)]),
+        ('STIPULATION of dismissal by Jane Plaintiff and Acme Corp', ['stipulation', 'stipulation of dismissal'], [('ENTERED_BY', 'Jane Plaintiff')], []),
+        ('ORDER granting motion to dismiss', ['order', 'granting motion to dismiss'], [('GRANT', 'granting')], [('granting', 3)]),
+        ('CIVIL case terminated', ['case dismissed'], [], []),
+    ],
+    [
+        ('COMPLAINT filed by Jane Plaintiff', ['complaint'], [], []),
+        ('MOTION to dismiss by Pat Counsel', ['motion', 'dismissing motion', 'motion to dismiss'], [('ENTERED_BY', 'Pat Counsel')], []),
+        ('MOTION to dismiss by Sam Lawyer', ['motion', 'dismissing motion', 'motion to dismiss'], [('ENTERED_BY', 'Sam Lawyer')], []),
+        ('ORDER granting 2 motion to dismiss', ['order', 'granting motion to dismiss'], [('GRANT', '2')], []),
+        ('ORDER denying 3 motion to dismiss', ['order'], [('DENY', '3')], []),
+        ('MINUTE entry, case closed', ['minute entry'], [], []),
+    ],
+]
+
+
+def case_header(ucid, docket):
+    return {
+        'ucid': ucid,
+        'case_name': 'Plaintiff v. Defendant',
+        'nature_suit': '442 Civil Rights: Employment',
+        'parties': [
+            {'name': 'Jane Plaintiff', 'party_type': 'plaintiff', 'counsel': [{'name': 'Pat Counsel'}]},
+            {'name': 'Acme Corp', 'party_type': 'defendant', 'counsel': [{'name': 'Sam Lawyer'}]},
+        ],
+        'docket': docket,
+    }
+
+
+def span_cases():
+    """Case and label json for SPAN_DOCKETS, with span offsets found in the docket text."""
+    cases = []
+    for i, entries in enumerate(SPAN_DOCKETS):
+        docket = []
+        label_json = []
+        for row_number, (text, labels, spans, edges) in enumerate(entries):
+            spans = [
+                {'entity': entity, 'start': text.index(span_text), 'end': text.index(span_text) + len(span_text), 'text': span_text}
+                for entity, span_text in spans
+            ]
+            edges = [
+                [row_number, related, {'start': text.index(span_text), 'end': text.index(span_text) + len(span_text)}]
+                for span_text, related in edges
+            ]
+            docket.append({'ind': row_number + 1, 'date_filed': None, 'docket_text': text, 'documents': [], 'edges': edges})
+            label_json.append({'row_number': row_number, 'labels': labels, 'spans': spans})
+        cases.append((case_header(f'ilnd;;1:17-cv-{i:05d}', docket), label_json))
+    return cases
+
+
+def example_cases():
+    """
+    Synthetic case and label json, grouping the examples into dockets of DOCKET_SIZE entries in file order,
+    followed by the span_cases.
+    """
+    examples = pd.read_csv(EXAMPLES_PATH)
+    cases = []
+    for i in range(0, len(examples), DOCKET_SIZE):
+        docket = []
+        label_json = []
+        for row_number, (_, example) in enumerate(examples.iloc[i:i + DOCKET_SIZE].iterrows()):
+            date = re.search(r'\(Entered: (\d{2}/\d{2}/\d{4})\)', example['docket_text'])
+            docket.append({
+                'ind': str(row_number + 1),
+                'date_filed': date.group(1) if date else None,
+                'docket_text': example['docket_text'],
+                'documents': [],
+                'edges': [],
+            })
+            labels = example['labels'].split('|') if isinstance(example['labels'], str) else []
+            label_json.append({'row_number': row_number, 'labels': labels, 'spans': []})
+        cases.append((case_header(f'ilnd;;1:16-cv-{i // DOCKET_SIZE:05d}', docket), label_json))
+    return cases + span_cases()
+
+
+def docket_output(case_json, label_json, skip_monkey_patch):
+    docket = scales_nlp.Docket.from_json(
+        json.loads(json.dumps(case_json)), label_json=json.loads(json.dumps(label_json)),
+        judge_df=pd.DataFrame(), skip_monkey_patch=skip_monkey_patch,
+    )
+    return {
+        'events': [[event.name, event.event_type, None if event.entry is None else event.entry.row_number] for event in docket.events],
+        'labels': [sorted(entry.labels) for entry in docket],
+    }
+
+
+def all_outputs():
+    return {
+        str(skip_monkey_patch): {
+            case_json['ucid']: docket_output(case_json, label_json, skip_monkey_patch)
+            for case_json, label_json in example_cases()
+        }
+        for skip_monkey_patch in (False, True)
+    }
+
+
+@pytest.mark.parametrize('skip_monkey_patch', [False, True])
+def test_process_events_matches_expected(skip_monkey_patch):
+    expected = json.loads(EXPECTED_PATH.read_text())[str(skip_monkey_patch)]
+    for case_json, label_json in example_cases():
+        assert docket_output(case_json, label_json, skip_monkey_patch) == expected[case_json['ucid']], case_json['ucid']
+
+
+if __name__ == '__main__':
+    EXPECTED_PATH.parent.mkdir(parents=True, exist_ok=True)
+    EXPECTED_PATH.write_text(json.dumps(all_outputs(), indent=1))
+    print('Saved', EXPECTED_PATH)
@@ -0,0 +1,76 @@
+"""
+Memory check for the `__slots__` layout of `DocketEntry` and `Event`.
+
+Entries and events are copied into plain classes that hold the same attribute values in an instance `__dict__`,
+the layout they had before, and the memory allocated for the instances of each layout is compared.  Run
+`python tests/test_docket_memory.py` for the bytes per entry of each layout.
+"""
+import tracemalloc
+from scales_nlp.docket import DocketEntry, Event
+
+
+class DictEntry():
+    pass
+
+
+class DictEvent():
+    pass
+
+
+def copy_layout(objects, cls):
+    """Copies of objects as instances of cls, sharing the attribute values."""
+    copies = []
+    for obj in objects:
+        copy = object.__new__(cls)
+        for name in type(obj).__slots__:
+            setattr(copy, name, getattr(obj, name))
+        copies.append(copy)
+    return copies
+
+
+def make_entries(n):
+    entries = [
+        DocketEntry(i, entry_number=str(i + 1), date_filed='01/02/2018', text='MINUTE entry before the Honorable Judge.')
+        for i in range(n)
+    ]
+    events = [Event('motion', 'motion', entry) for entry in entries]
+    return entries, events
+
+
+def allocated_bytes(build):
+    tracemalloc.start()
+    try:
+        objects = build()
+        size = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    del objects
+    return size
+
+
+def layout_bytes(n):
+    """Bytes allocated for n entries and events in the slotted and dict layouts, excluding the attribute values."""
+    entries, events = make_entries(n)
+    slotted = allocated_bytes(lambda: (copy_layout(entries, DocketEntry), copy_layout(events, Event)))
+    dict_layout = allocated_bytes(lambda: (copy_layout(entries, DictEntry), copy_layout(events, DictEvent)))
+    return slotted, dict_layout
+
+
+def test_instances_have_no_dict():
+    entry = DocketEntry(0, date_filed='01/02/2018', text='ORDER')
+    event = Event('motion', 'motion', entry)
+    assert not hasattr(entry, '__dict__')
+    assert not hasattr(event, '__dict__')
+    assert entry.event is event
+
+
+def test_slots_use_less_memory():
+    slotted, dict_layout = layout_bytes(1000)
+    assert slotted < dict_layout
+
+
+if __name__ == '__main__':
+    n = 100000
+    slotted, dict_layout = layout_bytes(n)
+    print(f'__slots__: {slotted / n:,.0f} bytes per entry and event')
+    print(f'__dict__:  {dict_layout / n:,.0f} bytes per entry and event ({dict_layout / slotted:.1f}x)')
@@ -0,0 +1,55 @@
+"""
+Checks that a download run only scrapes (and bills for) the cases it was given.
+
+The scraper is replaced with a function that writes the html of each case to the PACER_DIR, so no PACER
+account is needed.
+"""
+import pytest
+import scales_nlp
+from scales_nlp.downloads import DownloadQueue, download_cases
+
+
+UCIDS = [f'ilnd;;1:99-cv-{i:05d}' for i in range(4)]
+
+
+@pytest.fixture
+def scraped(monkeypatch):
+    scraped = []
+
+    def run_scraper(court, ucids, workers=1, scraper_cmd=None):
+        for ucid in ucids:
+            path = scales_nlp.case_path(ucid, html=True)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text('<html>Billable Pages: 7</html>')
+        scraped.extend(ucids)
+        return 0
+
+    monkeypatch.setattr(scales_nlp, 'run_scraper', run_scraper)
+    yield scraped
+    for ucid in UCIDS:
+        scales_nlp.case_path(ucid, html=True).unlink(missing_ok=True)
+
+
+def test_run_only_downloads_given_cases(tmp_path, scraped):
+    queue = DownloadQueue(path=tmp_path / 'queue.json', ledger_path=tmp_path / 'ledger.csv')
+    # left pending by an earlier run, e.g. one that ran out of budget
+    queue.add(UCIDS[:3])
+    queue.add(UCIDS[3:])
+    queue.run(ucids=UCIDS[3:])
+    assert scraped == UCIDS[3:]
+    assert queue.counts() == {'pending': 3, 'done': 1}
+
+    queue.run()
+    assert sorted(scraped) == UCIDS
+    assert queue.counts() == {'done': 4}
+
+
+def test_download_cases_resume(tmp_path, scraped, monkeypatch):
+    monkeypatch.setattr(scales_nlp.downloads, 'DownloadQueue', lambda **kwargs: DownloadQueue(
+        path=tmp_path / 'queue.json', ledger_path=tmp_path / 'ledger.csv', **kwargs,
+    ))
+    DownloadQueue(path=tmp_path / 'queue.json').add(UCIDS[:3])
+    download_cases(UCIDS[3:])
+    assert scraped == UCIDS[3:]
+    download_cases([], resume=True)
+    assert sorted(scraped) == UCIDS
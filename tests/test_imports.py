@@ -0,0 +1,58 @@
+"""
+Import-time checks for the lazy `scales_nlp` package.
+
+`import scales_nlp` should not import torch, transformers, datasets or sklearn, or read the court table, until a
+training routine, pipeline or court lookup is used.  Each check runs in a fresh interpreter so that modules
+imported by other tests do not leak in.
+"""
+import json
+import subprocess
+import sys
+import scales_nlp
+
+
+HEAVY_MODULES = ['torch', 'transformers', 'datasets', 'sklearn', 'evaluate']
+IMPORT_SECONDS = 2
+
+
+def run_python(code):
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def test_import_skips_heavy_modules():
+    loaded = run_python(
+        'import json, sys\n'
+        'import scales_nlp\n'
+        f'print(json.dumps([name for name in {HEAVY_MODULES!r} if name in sys.modules]))\n'
+    )
+    assert loaded == []
+
+
+def test_import_time():
+    seconds = run_python(
+        'import json, time\n'
+        'start = time.perf_counter()\n'
+        'import scales_nlp\n'
+        'print(json.dumps(time.perf_counter() - start))\n'
+    )
+    assert seconds < IMPORT_SECONDS
+
+
+def test_court_data_is_read_on_first_use():
+    counts = run_python(
+        'import json\n'
+        'import scales_nlp\n'
+        'before = len(scales_nlp.utils._court_data)\n'
+        'courts = scales_nlp.COURTS\n'
+        'print(json.dumps([before, len(scales_nlp.utils._court_data), len(courts)]))\n'
+    )
+    assert counts[0] == 0
+    assert counts[1] == 3
+    assert counts[2] > 0
+
+
+def test_lazy_attributes():
+    assert scales_nlp.COURTS is scales_nlp.utils.court_data()['COURTS']
+    assert scales_nlp.courts().equals(scales_nlp.COURTS)
+    assert list(scales_nlp.STATES) == list(scales_nlp.utils.states())
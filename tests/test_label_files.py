@@ -0,0 +1,42 @@
+"""
+Regression checks for reading labels from a training data file with missing label cells.
+
+A missing cell is an empty label set for multi-label classification and token classification, and the example
+is dropped for classification.
+"""
+import pytest
+from scales_nlp.routines import ClassificationRoutine, MultiLabelClassificationRoutine, TokenClassificationRoutine
+
+
+@pytest.fixture
+def data_path(tmp_path):
+    path = tmp_path / 'data.csv'
+    path.write_text('text,label\nfirst,motion|order\nsecond,\nthird,order\n')
+    return path
+
+
+def file_labels(routine, data_path):
+    data = routine.drop_unlabeled(routine.load_data_file(data_path))
+    routine.label_names = routine.collect_label_names(data)
+    return routine.encode_labels(routine.parse_labels(data['label']))
+
+
+def test_multi_label_missing_label(data_path):
+    routine = MultiLabelClassificationRoutine()
+    assert file_labels(routine, data_path) == [[1, 1], [0, 0], [0, 1]]
+    assert routine.label_names == ['motion', 'order']
+
+
+def test_classification_missing_label(data_path):
+    routine = ClassificationRoutine()
+    assert file_labels(routine, data_path) == [[1, 0], [0, 1]]
+    assert routine.label_names == ['motion|order', 'order']
+
+
+def test_token_classification_missing_label(tmp_path):
+    path = tmp_path / 'data.csv'
+    path.write_text('text,label\nfirst motion,"[{""start"": 6, ""end"": 12, ""label"": ""MOTION""}]"\nsecond,\n')
+    routine = TokenClassificationRoutine()
+    data = routine.drop_unlabeled(routine.load_data_file(path))
+    assert routine.collect_label_names(data) == ['MOTION']
+    assert routine.parse_labels(data['label'])[1] == []
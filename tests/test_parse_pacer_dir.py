@@ -0,0 +1,68 @@
+"""
+Checks that `scales_nlp.utils.parse_pacer_dir` only submits the cases whose json is missing or stale.
+
+The cases are written to a test court in the PACER_DIR, indexed in a temporary PacerIndex, and the parser is
+replaced with a function that writes their json.
+"""
+import os
+import shutil
+import pytest
+import scales_nlp
+from scales_nlp import config
+from scales_nlp.index import PacerIndex
+
+
+COURT = 'zztestd'
+UCIDS = [f'{COURT};;1:16-cv-{i:05d}' for i in range(3)]
+
+
+def write(path, mtime):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text('{}')
+    os.utime(path, (mtime, mtime))
+
+
+@pytest.fixture
+def parsed(tmp_path, monkeypatch):
+    index = PacerIndex(tmp_path / 'index.sqlite')
+    monkeypatch.setattr(scales_nlp, 'pacer_index', lambda: index)
+    parsed = []
+
+    def run_parser(court, ucids=None):
+        for ucid in ucids if ucids is not None else UCIDS:
+            write(scales_nlp.case_path(ucid), 3000)
+        parsed.append((court, ucids))
+        return {'court': court, 'returncode': 0, 'seconds': 1, 'stderr': ''}
+
+    monkeypatch.setattr(scales_nlp.utils, 'run_parser', run_parser)
+    for ucid in UCIDS:
+        write(scales_nlp.case_path(ucid, html=True), 2000)
+    write(scales_nlp.case_path(UCIDS[0]), 2500)
+    write(scales_nlp.case_path(UCIDS[1]), 1000)
+    index.refresh(COURT)
+    yield parsed
+    shutil.rmtree(config['PACER_DIR'] / COURT)
+
+
+def test_only_stale_cases_are_parsed(parsed):
+    results = scales_nlp.utils.parse_pacer_dir(COURT)
+    assert parsed == [(COURT, UCIDS[1:])]
+    assert results[0]['files'] == 2
+
+    scales_nlp.utils.parse_pacer_dir(COURT)
+    assert len(parsed) == 1
+
+
+def test_overwritten_html_needs_full_index(parsed):
+    scales_nlp.utils.parse_pacer_dir(COURT)
+    write(scales_nlp.case_path(UCIDS[0], html=True), 4000)
+    scales_nlp.utils.parse_pacer_dir(COURT)
+    assert len(parsed) == 1
+    scales_nlp.utils.parse_pacer_dir(COURT, full_index=True)
+    assert parsed[-1] == (COURT, UCIDS[:1])
+
+
+def test_force_parses_every_case(parsed):
+    results = scales_nlp.utils.parse_pacer_dir(COURT, force=True)
+    assert parsed == [(COURT, None)]
+    assert results[0]['files'] == 3
@@ -0,0 +1,56 @@
+"""
+Checks for `scales_nlp.docket.PartyMatcher` against a full scan of the names with fuzzywuzzy.
+"""
+import random
+from fuzzywuzzy import fuzz
+import pytest
+from scales_nlp.docket import PartyMatcher, normalize_name
+
+
+def random_names(rng, n):
+    words = ['acme', 'corp', 'smith', 'jane', 'john', 'bank', 'city', 'chicago', 'county', 'police', 'inc', 'llc']
+    return [' '.join(rng.choice(words) for _ in range(rng.randint(1, 4))) for _ in range(n)]
+
+
+def full_scan(names, text, threshold=80):
+    """First name over the threshold, scoring every name with fuzzywuzzy."""
+    text = normalize_name(text)
+    for name in names:
+        if fuzz.token_set_ratio(text, normalize_name(name), full_process=False) > threshold:
+            return name
+    return None
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_matches_full_scan(seed):
+    rng = random.Random(seed)
+    names = random_names(rng, 30)
+    matcher = PartyMatcher({'party': names})
+    for text in random_names(rng, 50) + ['unrelated words', '']:
+        expected = full_scan(names, text)
+        if expected is not None and not set(normalize_name(text).split()) & set(normalize_name(expected).split()):
+            # a match sharing no token with the text is only found when no name shares a token with it
+            continue
+        assert matcher.match(text)['party'] == expected, text
+
+
+def test_miss_only_scores_block(monkeypatch):
+    matcher = PartyMatcher({'party': ['acme corp', 'jane smith', 'city of chicago', 'chicago police']})
+    scored = []
+    score = matcher.score
+    monkeypatch.setattr(matcher, 'score', lambda text, name: scored.append(name) or score(text, name))
+    assert matcher.match('john smith')['party'] is None
+    assert scored == ['jane smith']
+
+
+def test_empty_block_scans_all_names():
+    matcher = PartyMatcher({'party': ['acme corp', 'jane smith']})
+    assert matcher.match('jane smiht')['party'] == 'jane smith'
+    assert matcher.match('acme crop')['party'] == 'acme corp'
+
+
+def test_score_matches_fuzzywuzzy():
+    rng = random.Random(0)
+    matcher = PartyMatcher({})
+    for a, b in zip(random_names(rng, 500), random_names(rng, 500)):
+        assert matcher.score(a, b) == fuzz.token_set_ratio(a, b, full_process=False)
@@ -0,0 +1,99 @@
+"""
+Equivalence check for the span to BIO label alignment in `scales_nlp.datasets.spans_to_labels`.
+
+Random offset mappings and spans, including special and padding tokens, overlapping spans and tokens that
+skip over spans, are aligned with `spans_to_labels` and compared with the per-token loop from before the
+alignment was shared by the routines.  Run `python tests/test_span_alignment.py` for a throughput comparison.
+"""
+import time
+import numpy as np
+import pytest
+from scales_nlp.datasets import bio_label_map, example_spans_to_labels, spans_to_labels
+
+
+LABEL_MAP = bio_label_map(['MOTION', 'ORDER', 'PARTY'])
+
+
+def loop_spans_to_labels(offset_mapping, spans, label_map):
+    """The per-token loop from TokenClassificationDataset.example_spans_to_labels in the baseline."""
+    spans = sorted(spans, key=lambda x: x['start'])
+
+    labels = []
+    current_label = None
+    for i in range(len(offset_mapping)):
+        offset = offset_mapping[i]
+
+        if len(spans) > 0 and offset[0] >= spans[0]['end']:
+            spans.pop(0)
+            current_label = None
+
+        if offset[1] == 0:
+            labels.append(-100)
+            current_label = None
+        elif len(spans) == 0 or offset[1] <= spans[0]['start']:
+            labels.append(0)
+            current_label = None
+        else:
+            if current_label is None:
+                current_label = spans[0]['label']
+                labels.append(label_map['B-' + current_label])
+            else:
+                labels.append(label_map['I-' + current_label])
+    return labels
+
+
+def random_example(rng, max_tokens=40, max_spans=6):
+    offset_mapping = [(0, 0)]
+    position = 0
+    for _ in range(rng.integers(0, max_tokens)):
+        start = position + int(rng.integers(0, 3))
+        end = start + int(rng.integers(0, 6))
+        offset_mapping.append((start, end))
+        position = max(position, end)
+    offset_mapping.append((0, 0))
+    spans = []
+    for _ in range(rng.integers(0, max_spans)):
+        start = int(rng.integers(0, position + 5))
+        spans.append({'start': start, 'end': start + int(rng.integers(1, 15)), 'label': str(rng.choice(['MOTION', 'ORDER', 'PARTY']))})
+    return offset_mapping, spans
+
+
+def random_batch(seed, batch_size=32, max_tokens=40, max_spans=6):
+    rng = np.random.default_rng(seed)
+    return [random_example(rng, max_tokens=max_tokens, max_spans=max_spans) for _ in range(batch_size)]
+
+
+@pytest.mark.parametrize('seed', range(50))
+def test_spans_to_labels_matches_loop(seed):
+    batch = random_batch(seed)
+    offset_mappings = [offset_mapping for offset_mapping, _ in batch]
+    spans = [example_spans for _, example_spans in batch]
+    expected = [loop_spans_to_labels(offset_mapping, example_spans, LABEL_MAP) for offset_mapping, example_spans in batch]
+    assert spans_to_labels(offset_mappings, spans, LABEL_MAP) == expected
+    assert [example_spans_to_labels(offset_mapping, example_spans, LABEL_MAP) for offset_mapping, example_spans in batch] == expected
+
+
+def test_spans_are_not_mutated():
+    offset_mapping, spans = [(0, 0), (0, 4), (5, 9), (0, 0)], [{'start': 5, 'end': 9, 'label': 'ORDER'}, {'start': 0, 'end': 4, 'label': 'MOTION'}]
+    original = [dict(span) for span in spans]
+    spans_to_labels([offset_mapping], [spans], LABEL_MAP)
+    assert spans == original
+
+
+def test_empty_batch():
+    assert spans_to_labels([[], []], [[], []], LABEL_MAP) == [[], []]
+
+
+if __name__ == '__main__':
+    batch = random_batch(0, batch_size=5000, max_tokens=254, max_spans=4)
+    offset_mappings = [offset_mapping for offset_mapping, _ in batch]
+    spans = [example_spans for _, example_spans in batch]
+    start = time.perf_counter()
+    for offset_mapping, example_spans in batch:
+        loop_spans_to_labels(offset_mapping, example_spans, LABEL_MAP)
+    loop_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    spans_to_labels(offset_mappings, spans, LABEL_MAP)
+    seconds = time.perf_counter() - start
+    print(f'per-token loop: {len(batch) / loop_seconds:,.0f} examples/s')
+    print(f'spans_to_labels: {len(batch) / seconds:,.0f} examples/s ({loop_seconds / seconds:.1f}x)')
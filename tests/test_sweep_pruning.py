@@ -0,0 +1,32 @@
+"""
+Checks for `scales_nlp.routines.MedianPruningCallback`, driven with the evaluations of several sweep trials.
+"""
+from types import SimpleNamespace
+from scales_nlp.routines import MedianPruningCallback
+
+
+def evaluate(callback, step, value, metric='eval_loss'):
+    control = SimpleNamespace(should_training_stop=False)
+    callback.on_evaluate(None, SimpleNamespace(global_step=step), control, metrics={metric: value})
+    return control.should_training_stop
+
+
+def test_prunes_below_median():
+    history = {}
+    callbacks = [MedianPruningCallback(i, history, 'loss', greater_is_better=False, min_trials=2) for i in range(4)]
+    assert not evaluate(callbacks[0], 10, 0.5)
+    assert not evaluate(callbacks[1], 10, 0.7)
+    assert not evaluate(callbacks[2], 10, 0.6)
+    assert evaluate(callbacks[3], 10, 0.9) and callbacks[3].pruned
+    assert not evaluate(callbacks[3], 20, 0.9)
+    assert history[3] == {10: 0.9, 20: 0.9}
+
+
+def test_greater_is_better_and_final_evaluation():
+    history = {0: {10: 0.8}, 1: {10: 0.6}}
+    callback = MedianPruningCallback(2, history, 'eval_f1', greater_is_better=True, min_trials=2)
+    assert not evaluate(callback, 10, 0.75, metric='eval_f1')
+    # the evaluation of the best model after training repeats the step and is not compared again
+    assert not evaluate(callback, 10, 0.1, metric='eval_f1')
+    assert history[2] == {10: 0.75}
+    assert evaluate(MedianPruningCallback(3, history, 'f1', greater_is_better=True, min_trials=2), 10, 0.65, metric='eval_f1')